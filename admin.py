@@ -5,27 +5,42 @@ Handles admin commands and user management.
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from models import User, FAQ, Payment, get_db
-from datetime import datetime, timedelta
+import repository
+from repository import DatabaseUnavailable
+from broadcast import dispatch_broadcasts, send_with_limits
+from stats import estimate_mrr
+from callback_router import router
+from catalog import PLANS, SUBSCRIPTION_PRICES, get_catalog
+import functools
 import logging
 
 logger = logging.getLogger(__name__)
 
 ADMIN_USERNAME = "prosto_993"
-CARD_NUMBER = "9860 3501 0188 0457"
 
-# Subscription prices in UZS
-SUBSCRIPTION_PRICES = {
-    "start": 0,  # Free basic plan
-    "smart": 870000,
-    "pro_plus": 1650000,
-    "speaking_club": 190000
-}
+# Unverified payments shown per page of the admin queue
+PAYMENT_PAGE_SIZE = 20
+
+# Users shown per page of the admin user browser
+USER_PAGE_SIZE = 10
 
 def is_admin(user):
     """Check if user is admin."""
     return user and user.username == ADMIN_USERNAME
 
+# Callback routes that only the admin may use
+admin_route = functools.partial(router.route, guard=is_admin, denied_text="❌ У вас нет прав администратора.")
+
+def admin_menu_markup():
+    """Keyboard of the admin main menu."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("📝 Управление FAQ", callback_data=router.data("admin_faq"))],
+        [InlineKeyboardButton("👥 Управление пользователями", callback_data=router.data("admin_users"))],
+        [InlineKeyboardButton("💰 Управление подписками", callback_data=router.data("admin_subscriptions"))],
+        [InlineKeyboardButton("💳 Платежи на проверке", callback_data=router.data("admin_payments"))],
+        [InlineKeyboardButton("📊 Статистика", callback_data=router.data("admin_stats"))]
+    ])
+
 async def admin_edit_bot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Admin command to edit bot settings."""
     user = update.effective_user
@@ -34,13 +49,7 @@ async def admin_edit_bot(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("❌ У вас нет прав администратора.")
         return
 
-    keyboard = [
-        [InlineKeyboardButton("📝 Управление FAQ", callback_data="admin_faq")],
-        [InlineKeyboardButton("👥 Управление пользователями", callback_data="admin_users")],
-        [InlineKeyboardButton("💰 Управление подписками", callback_data="admin_subscriptions")],
-        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = admin_menu_markup()
 
     await update.message.reply_text(
         "🔧 **Панель администратора SPEAKYZ**\n\nВыберите действие:",
@@ -48,40 +57,11 @@ async def admin_edit_bot(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         parse_mode='Markdown'
     )
 
-async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle admin callback queries."""
-    query = update.callback_query
-    await query.answer()
-
-    user = query.from_user
-    if not is_admin(user):
-        await query.edit_message_text("❌ У вас нет прав администратора.")
-        return
-
-    data = query.data
-
-    if data == "admin_faq":
-        await show_faq_management(query, context)
-    elif data == "admin_users":
-        await show_user_management(query, context)
-    elif data == "admin_subscriptions":
-        await show_subscription_management(query, context)
-    elif data == "admin_stats":
-        await show_admin_stats(query, context)
-    elif data == "admin_back":
-        await show_admin_main_menu(query, context)
-    elif data.startswith("faq_"):
-        await handle_faq_action(query, context, data)
-
-async def show_admin_main_menu(query, context):
+@admin_route("admin_back")
+async def show_admin_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show admin main menu."""
-    keyboard = [
-        [InlineKeyboardButton("📝 Управление FAQ", callback_data="admin_faq")],
-        [InlineKeyboardButton("👥 Управление пользователями", callback_data="admin_users")],
-        [InlineKeyboardButton("💰 Управление подписками", callback_data="admin_subscriptions")],
-        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    query = update.callback_query
+    reply_markup = admin_menu_markup()
 
     await query.edit_message_text(
         "🔧 **Панель администратора SPEAKYZ**\n\nВыберите действие:",
@@ -89,102 +69,143 @@ async def show_admin_main_menu(query, context):
         parse_mode='Markdown'
     )
 
-async def show_faq_management(query, context):
+@admin_route("admin_faq")
+async def show_faq_management(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show FAQ management interface."""
-    db = get_db()
-    if not db:
+    query = update.callback_query
+    try:
+        faqs = await repository.get_active_faqs()
+    except DatabaseUnavailable:
         await query.edit_message_text("❌ База данных недоступна.")
         return
 
-    faqs = db.query(FAQ).filter(FAQ.is_active == True).all()
-    db.close()
-
     text = "📝 **Управление FAQ**\n\n"
     keyboard = []
 
     for faq in faqs[:10]:  # Показываем только первые 10
         keyboard.append([InlineKeyboardButton(
             f"✏️ {faq.question[:30]}...", 
-            callback_data=f"faq_edit_{faq.id}"
+            callback_data=router.data("faq_edit", faq.id)
         )])
 
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="admin_back")])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=router.data("admin_back"))])
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
 
-async def show_user_management(query, context):
+@admin_route("admin_users")
+async def show_user_management(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show user management interface."""
-    db = get_db()
-    if not db:
+    await show_user_page(update, context, "all", 0, 0)
+
+# ulist:<plan>:<after_id>:<before_id>; plan "all" means no filter, before_id 0 means page forward
+@admin_route("ulist", str, int, int)
+async def show_user_page(update: Update, context: ContextTypes.DEFAULT_TYPE, plan_key, after_id, before_id) -> None:
+    """Show one page of the user list, optionally filtered by plan."""
+    query = update.callback_query
+    plan_labels = {p['key']: p['label'] for p in PLANS}
+    plan = None if plan_key == "all" else plan_key
+    before_id = before_id or None
+
+    try:
+        user_count, active_subs = await repository.get_user_counts()
+        users, has_prev, has_next = await repository.get_users_page(
+            plan=plan, after_id=after_id, before_id=before_id, limit=USER_PAGE_SIZE
+        )
+        filtered_count = await repository.get_users_count(plan=plan) if plan else user_count
+    except DatabaseUnavailable:
         await query.edit_message_text("❌ База данных недоступна.")
         return
 
-    user_count = db.query(User).count()
-    active_subs = db.query(User).filter(User.subscription_type.isnot(None)).count()
-    db.close()
-
-    text = f"👥 **Управление пользователями**\n\n"
+    # Plain text: usernames often contain underscores that break Markdown
+    text = f"👥 Управление пользователями\n\n"
     text += f"Всего пользователей: {user_count}\n"
-    text += f"Активных подписок: {active_subs}\n"
-
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="admin_back")]]
+    text += f"Активных подписок: {active_subs}\n\n"
+    if plan:
+        text += f"Фильтр: {plan_labels.get(plan, 'Без подписки' if plan == 'none' else plan)} ({filtered_count})\n"
+
+    for user in users:
+        name = f"@{user['username']}" if user['username'] else (user['first_name'] or user['telegram_id'])
+        sub_info = plan_labels.get(user['subscription_type'], user['subscription_type']) or "—"
+        if user['subscription_end']:
+            sub_info += f" до {user['subscription_end'].strftime('%d.%m.%Y')}"
+        text += f"#{user['id']} {name} · {sub_info}\n"
+    if not users:
+        text += "Пользователей нет."
+
+    filter_buttons = [InlineKeyboardButton(
+        ("• " if plan_key == key else "") + label, callback_data=router.data("ulist", key, 0, 0)
+    ) for key, label in [("all", "Все"), *plan_labels.items(), ("none", "Без подписки")]]
+
+    keyboard = [filter_buttons[i:i + 3] for i in range(0, len(filter_buttons), 3)]
+    nav = []
+    if has_prev and users:
+        nav.append(InlineKeyboardButton("◀️", callback_data=router.data("ulist", plan_key, 0, users[0]['id'])))
+    if has_next and users:
+        nav.append(InlineKeyboardButton("▶️", callback_data=router.data("ulist", plan_key, users[-1]['id'], 0)))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=router.data("admin_back"))])
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    await query.edit_message_text(text, reply_markup=reply_markup)
 
-async def show_subscription_management(query, context):
+@admin_route("admin_subscriptions")
+async def show_subscription_management(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show subscription management interface."""
+    query = update.callback_query
     text = "💰 **Управление подписками**\n\n"
     text += "Для управления подписками используйте команды:\n"
     text += "/remove_subscription @username - удалить подписку\n"
+    text += "/broadcast Текст - рассылка всем пользователям\n"
+    text += "/payments - платежи на проверке\n"
 
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="admin_back")]]
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=router.data("admin_back"))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
 
-async def show_admin_stats(query, context):
+@admin_route("admin_stats")
+async def show_admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show admin statistics."""
-    db = get_db()
-    if not db:
-        await query.edit_message_text("❌ База данных недоступна.")
-        return
-
+    query = update.callback_query
     try:
-        total_users = db.query(User).count()
-        active_subs = db.query(User).filter(User.subscription_type.isnot(None)).count()
-        faq_count = db.query(FAQ).filter(FAQ.is_active == True).count()
+        stats = await repository.get_stats()
+        plan_names = get_catalog().plan_names
 
         text = f"📊 **Статистика SPEAKYZ**\n\n"
-        text += f"👥 Всего пользователей: {total_users}\n"
-        text += f"💰 Активных подписок: {active_subs}\n"
-        text += f"❓ FAQ записей: {faq_count}\n"
-
-        db.close()
+        text += f"👥 Всего пользователей: {stats['total_users']}\n"
+        text += f"🆕 Новых сегодня: {stats['new_today']}, за неделю: {stats['new_week']}\n\n"
+        text += f"💰 Активных подписок: {stats['active_subs']}\n"
+        for plan, count in sorted(stats['plans'].items(), key=lambda item: -item[1]):
+            if count:
+                text += f"  • {plan_names.get(plan, plan)}: {count}\n"
+        text += f"💵 Оценка MRR: {estimate_mrr(stats, SUBSCRIPTION_PRICES):,} UZS\n\n"
+        text += f"❓ FAQ записей: {stats['faq_count']}\n"
+    except DatabaseUnavailable:
+        await query.edit_message_text("❌ База данных недоступна.")
+        return
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         text = "❌ Ошибка получения статистики"
-        if db:
-            db.close()
 
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="admin_back")]]
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=router.data("admin_back"))]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
 
-async def handle_faq_action(query, context, data):
-    """Handle FAQ-related actions."""
-    if data.startswith("faq_edit_"):
-        faq_id = data.replace("faq_edit_", "")
-        text = f"✏️ **Редактирование FAQ #{faq_id}**\n\n"
-        text += "Для редактирования FAQ отправьте команду:\n"
-        text += f"`/edit_faq {faq_id} Новый вопрос | Новый ответ`"
+@admin_route("faq_edit", int)
+async def show_faq_edit(update: Update, context: ContextTypes.DEFAULT_TYPE, faq_id) -> None:
+    """Explain how to edit a FAQ entry."""
+    query = update.callback_query
+    text = f"✏️ **Редактирование FAQ #{faq_id}**\n\n"
+    text += "Для редактирования FAQ отправьте команду:\n"
+    text += f"`/edit_faq {faq_id} Новый вопрос | Новый ответ`"
 
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="admin_faq")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=router.data("admin_faq"))]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
 
 async def remove_subscription_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Remove user subscription."""
@@ -200,29 +221,158 @@ async def remove_subscription_command(update: Update, context: ContextTypes.DEFA
 
     username = context.args[0].replace("@", "")
 
-    db = get_db()
-    if not db:
-        await update.message.reply_text("❌ База данных недоступна.")
-        return
-
     try:
-        target_user = db.query(User).filter(User.username == username).first()
+        telegram_id = await repository.remove_subscription(username)
 
-        if not target_user:
+        if telegram_id is None:
             await update.message.reply_text(f"❌ Пользователь @{username} не найден.")
-            db.close()
             return
 
-        target_user.subscription_type = None
-        target_user.subscription_end = None
-        target_user.speaking_clubs_count = 0
-        db.commit()
-        db.close()
-
         await update.message.reply_text(f"✅ Подписка пользователя @{username} удалена.")
 
+    except DatabaseUnavailable:
+        await update.message.reply_text("❌ База данных недоступна.")
     except Exception as e:
         logger.error(f"Error removing subscription: {e}")
         await update.message.reply_text("❌ Ошибка при удалении подписки.")
-        if db:
-            db.close()
\ No newline at end of file
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Queue a message for all active users."""
+    user = update.effective_user
+
+    if not is_admin(user):
+        await update.message.reply_text("❌ У вас нет прав администратора.")
+        return
+
+    # Take the raw text so line breaks survive
+    parts = update.message.text.split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip():
+        await update.message.reply_text("Использование: /broadcast Текст сообщения")
+        return
+
+    try:
+        broadcast_id = await repository.create_broadcast(parts[1].strip(), user.id)
+    except DatabaseUnavailable:
+        await update.message.reply_text("❌ База данных недоступна.")
+        return
+    except Exception as e:
+        logger.error(f"Error creating broadcast: {e}")
+        await update.message.reply_text("❌ Ошибка при создании рассылки.")
+        return
+
+    await update.message.reply_text(
+        f"📣 Рассылка #{broadcast_id} запущена. Я сообщу, когда она завершится."
+    )
+    context.application.create_task(dispatch_broadcasts(context.bot))
+
+async def render_payment_queue(header=""):
+    """Render the oldest unverified payments with approve and receipt buttons."""
+    payments, total = await repository.get_unverified_payments(PAYMENT_PAGE_SIZE)
+
+    text = header + f"💳 Платежи на проверке: {total}\n\n"
+    keyboard = []
+    for payment in payments:
+        payer = f"@{payment['username']}" if payment['username'] else (payment['first_name'] or payment['telegram_id'])
+        text += (f"#{payment['id']} · {payer} · {payment['subscription_type']} · "
+                 f"{int(payment['amount']):,} UZS · {payment['payment_date'].strftime('%d.%m %H:%M')}\n")
+        keyboard.append([
+            InlineKeyboardButton(f"🧾 Чек #{payment['id']}", callback_data=router.data("pay_receipt", payment['id'])),
+            InlineKeyboardButton(f"✅ #{payment['id']}", callback_data=router.data("pay_approve", payment['id']))
+        ])
+
+    if payments:
+        # Approving "up to" the last shown id never touches payments the admin has not seen
+        keyboard.append([InlineKeyboardButton(
+            f"✅ Подтвердить все показанные ({len(payments)})",
+            callback_data=router.data("pay_upto", payments[-1]['id'])
+        )])
+    else:
+        text += "Новых платежей нет."
+    keyboard.append([InlineKeyboardButton("🔄 Обновить", callback_data=router.data("admin_payments"))])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=router.data("admin_back"))])
+
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def notify_activated(bot, activated):
+    """Tell users that their payment was approved."""
+    plan_names = get_catalog().plan_names
+
+    for telegram_id, subscription_type, subscription_end in activated:
+        await send_with_limits(
+            bot, telegram_id,
+            f"✅ Оплата подтверждена!\n\n"
+            f"📋 Подписка: {plan_names.get(subscription_type, subscription_type)}\n"
+            f"📅 Действует до: {subscription_end.strftime('%d.%m.%Y')}"
+        )
+
+async def update_payment_queue(update: Update, context: ContextTypes.DEFAULT_TYPE, approve=None) -> None:
+    """Optionally run an approval, then re-render the payment queue in place."""
+    query = update.callback_query
+    header = ""
+    try:
+        if approve is not None:
+            activated = await approve
+            header = f"✅ Активировано подписок: {len(activated)}\n\n"
+            if activated:
+                context.application.create_task(notify_activated(context.bot, activated))
+
+        text, reply_markup = await render_payment_queue(header)
+    except DatabaseUnavailable:
+        await query.edit_message_text("❌ База данных недоступна.")
+        return
+    except Exception as e:
+        logger.error(f"Error handling payment queue: {e}")
+        await query.edit_message_text("❌ Ошибка при обработке платежей.")
+        return
+
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+@admin_route("admin_payments")
+async def show_payment_queue(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the queue of unverified payments."""
+    await update_payment_queue(update, context)
+
+@admin_route("pay_approve", int)
+async def approve_payment(update: Update, context: ContextTypes.DEFAULT_TYPE, payment_id) -> None:
+    """Approve one payment."""
+    await update_payment_queue(update, context, repository.approve_payments(
+        [payment_id], update.callback_query.from_user.id
+    ))
+
+@admin_route("pay_upto", int)
+async def approve_payment_page(update: Update, context: ContextTypes.DEFAULT_TYPE, last_payment_id) -> None:
+    """Approve every payment shown on the queue page."""
+    await update_payment_queue(update, context, repository.approve_payments_up_to(
+        last_payment_id, update.callback_query.from_user.id
+    ))
+
+@admin_route("pay_receipt", int)
+async def send_payment_receipt(update: Update, context: ContextTypes.DEFAULT_TYPE, payment_id) -> None:
+    """Send the receipt photo of a payment to the admin chat."""
+    chat_id = update.callback_query.message.chat_id
+    try:
+        file_id = await repository.get_payment_receipt(payment_id)
+    except DatabaseUnavailable:
+        await context.bot.send_message(chat_id=chat_id, text="❌ База данных недоступна.")
+        return
+
+    if file_id:
+        await context.bot.send_photo(chat_id=chat_id, photo=file_id, caption=f"🧾 Чек к платежу #{payment_id}")
+    else:
+        await context.bot.send_message(chat_id=chat_id, text=f"❌ У платежа #{payment_id} нет чека.")
+
+async def payments_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the queue of unverified payments."""
+    user = update.effective_user
+
+    if not is_admin(user):
+        await update.message.reply_text("❌ У вас нет прав администратора.")
+        return
+
+    try:
+        text, reply_markup = await render_payment_queue()
+    except DatabaseUnavailable:
+        await update.message.reply_text("❌ База данных недоступна.")
+        return
+
+    await update.message.reply_text(text, reply_markup=reply_markup)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Offline handler benchmark for SPEAKYZ bot.
+Drives the real handlers with synthetic updates. The Bot API is a local stub
+that records outgoing calls, and the database is DATABASE_URL or a throwaway
+SQLite file. Reports latency percentiles and throughput per scenario and
+concurrency level, and saves or compares JSON baselines.
+
+Usage:
+    python benchmark.py [--users 1,10,100] [--updates 20] [--scenarios start,profile]
+                        [--api-latency MS] [--save FILE] [--compare FILE] [--tolerance 0.25]
+                        [--allow-real-db]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+# Must be set before the bot modules read their configuration
+_db_file = None
+if not os.getenv("DATABASE_URL"):
+    _db_file = os.path.join(tempfile.mkdtemp(prefix="speakyz-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db_file}"
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("BOT_MODE", "polling")
+# Flood control would drop most synthetic traffic; it still runs, just never limits
+for _name in ("FLOOD_USER_RATE", "FLOOD_USER_BURST", "FLOOD_GLOBAL_RATE", "FLOOD_GLOBAL_BURST"):
+    os.environ.setdefault(_name, "1000000")
+
+from sqlalchemy import delete
+from telegram import Update
+from telegram.request import BaseRequest
+from models import User, MediaFile, init_db, init_default_faq, get_db
+from admin import ADMIN_USERNAME
+from callback_router import router
+from user_buffer import user_writes
+import bot
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("start", "profile", "plans", "admin_stats")
+DEFAULT_USERS = (1, 10, 100)
+# Synthetic users get negative telegram ids, which Telegram never issues to users
+BENCH_ID_BASE = -1_000_000_000_000
+BOT_ID = 123456
+# file_id the stub returns for uploaded photos
+BENCH_PHOTO_ID = 'bench-photo'
+
+
+def bench_user_id(n):
+    return BENCH_ID_BASE - n
+
+
+class StubRequest(BaseRequest):
+    """Bot API transport that answers every call locally and counts them by method."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, parameters):
+        self._message_id += 1
+        chat_id = parameters.get('chat_id', 0)
+        return {
+            'message_id': parameters.get('message_id', self._message_id),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': parameters.get('text', ''),
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        parameters = request_data.parameters if request_data else {}
+        if api_method == 'getMe':
+            result = {'id': BOT_ID, 'is_bot': True, 'first_name': 'SPEAKYZ', 'username': 'speakyz_bench_bot'}
+        elif api_method == 'sendPhoto':
+            result = self._message(parameters)
+            result['photo'] = [{'file_id': BENCH_PHOTO_ID, 'file_unique_id': BENCH_PHOTO_ID,
+                                'width': 800, 'height': 600}]
+        elif api_method.startswith(('send', 'edit')):
+            result = self._message(parameters)
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+
+def _user(telegram_id, admin=False):
+    return {
+        'id': telegram_id,
+        'is_bot': False,
+        'first_name': 'Bench',
+        'username': ADMIN_USERNAME if admin else f"bench{telegram_id}",
+    }
+
+
+def make_command(update_id, telegram_id, command):
+    """A private-chat /command message."""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': telegram_id, 'type': 'private'},
+            'from': _user(telegram_id),
+            'text': f"/{command}",
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command) + 1}],
+        },
+    }
+
+
+def make_callback(update_id, telegram_id, data, admin=False):
+    """A button press on a bot message with a photo caption, like the main menu."""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(telegram_id, admin),
+            'chat_instance': str(telegram_id),
+            'data': data,
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': telegram_id, 'type': 'private'},
+                'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'SPEAKYZ'},
+                'caption': 'menu',
+            },
+        },
+    }
+
+
+def make_update(scenario, update_id, telegram_id):
+    if scenario == 'start':
+        return make_command(update_id, telegram_id, 'start')
+    if scenario == 'profile':
+        return make_callback(update_id, telegram_id, router.data('my_profile'))
+    if scenario == 'plans':
+        return make_callback(update_id, telegram_id, router.data('show_plans'))
+    if scenario == 'admin_stats':
+        return make_callback(update_id, telegram_id, router.data('admin_stats'), admin=True)
+    raise ValueError(f"Unknown scenario {scenario!r}")
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+async def run_scenario(application, stub, scenario, users, updates_per_user, next_update_id):
+    """
+    Each user sends updates one after another; all users run at once.
+    Updates go through the application's update processor, as the fetcher hands them over
+    in production, so per-chat ordering and the concurrency limits apply.
+    """
+    latencies = []
+    calls_before = sum(stub.calls.values())
+
+    async def client(telegram_id, first_update_id):
+        for i in range(updates_per_user):
+            update = Update.de_json(make_update(scenario, first_update_id + i, telegram_id), application.bot)
+            started = time.perf_counter()
+            await application.update_processor.process_update(update, application.process_update(update))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(bench_user_id(n), next_update_id + n * updates_per_user) for n in range(users)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'count': count,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'updates_per_sec': round(count / elapsed, 1) if elapsed else 0.0,
+        'api_calls_per_update': round((sum(stub.calls.values()) - calls_before) / count, 2) if count else 0.0,
+    }
+
+
+async def run_benchmark(scenarios, user_levels, updates_per_user, api_latency):
+    stub = StubRequest(api_latency)
+    application = bot.build_application(request=stub)
+    await application.initialize()
+    await bot.on_startup(application)
+
+    results = {}
+    try:
+        # Register every synthetic user once so profile lookups find them
+        max_users = max(user_levels)
+        await run_scenario(application, stub, 'start', max_users, 1, 1)
+        await user_writes.flush()
+
+        next_update_id = max_users + 1
+        for scenario in scenarios:
+            for users in user_levels:
+                result = await run_scenario(application, stub, scenario, users, updates_per_user, next_update_id)
+                next_update_id += users * updates_per_user
+                results[f"{scenario}@{users}"] = result
+                print(f"{scenario:<12} {users:>4} users  p50 {result['p50_ms']:>8.2f} ms  "
+                      f"p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms  "
+                      f"{result['updates_per_sec']:>9.1f} upd/s  "
+                      f"{result['api_calls_per_update']:.1f} API calls/upd")
+    finally:
+        await bot.on_shutdown(application)
+        await application.shutdown()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Report results that are worse than the baseline by more than tolerance. Returns the regressions."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get('results', {}).get(key)
+        if not base:
+            continue
+        if base['p95_ms'] and result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if result['updates_per_sec'] < base['updates_per_sec'] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {base['updates_per_sec']} -> {result['updates_per_sec']} upd/s")
+    return regressions
+
+
+def remove_bench_data(user_count):
+    """Delete exactly the synthetic users and the stub photo file_id from a real database."""
+    db = get_db()
+    if not db:
+        return
+    try:
+        bench_ids = [bench_user_id(n) for n in range(user_count)]
+        db.execute(delete(User).where(User.telegram_id.in_(bench_ids)))
+        db.execute(delete(MediaFile).where(MediaFile.file_id == BENCH_PHOTO_ID))
+        db.commit()
+    except Exception as e:
+        logger.error(f"Could not remove benchmark users: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SPEAKYZ bot handlers offline.")
+    parser.add_argument('--users', default=",".join(map(str, DEFAULT_USERS)),
+                        help="comma-separated concurrency levels (default: 1,10,100)")
+    parser.add_argument('--updates', type=int, default=20, help="updates per user per scenario (default: 20)")
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS),
+                        help=f"comma-separated scenarios (default: {','.join(SCENARIOS)})")
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help="simulated Bot API latency in milliseconds (default: 0)")
+    parser.add_argument('--save', metavar='FILE', help="write results as a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="fail if results are worse than this baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline (default: 0.25 = 25%%)")
+    parser.add_argument('--allow-real-db', action='store_true',
+                        help="run against a non-SQLite DATABASE_URL (writes synthetic users, then deletes them)")
+    args = parser.parse_args(argv)
+
+    args.users = [int(level) for level in args.users.split(",")]
+    args.scenarios = args.scenarios.split(",")
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+
+    if not os.environ['DATABASE_URL'].startswith('sqlite') and not args.allow_real_db:
+        print("❌ DATABASE_URL is not SQLite. The benchmark writes to the database; "
+              "unset DATABASE_URL or pass --allow-real-db.")
+        return 2
+
+    if not init_db():
+        print("❌ Database not available")
+        return 1
+    init_default_faq()
+    print(f"Database: {os.environ['DATABASE_URL'].split('@')[-1]}")
+
+    try:
+        results = asyncio.run(run_benchmark(args.scenarios, args.users, args.updates, args.api_latency / 1000))
+    finally:
+        if _db_file is None:
+            remove_bench_data(max(args.users))
+        else:
+            shutil.rmtree(os.path.dirname(_db_file), ignore_errors=True)
+
+    if args.save:
+        baseline = {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+            'updates_per_user': args.updates,
+            'api_latency_ms': args.api_latency,
+            'results': results,
+        }
+        with open(args.save, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('api_latency_ms') != args.api_latency or baseline.get('updates_per_user') != args.updates:
+            print("⚠️  Baseline was recorded with different --api-latency/--updates, comparison may be misleading")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
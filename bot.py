@@ -4,43 +4,59 @@ Includes admin panel, FAQ, subscription management, and keep-alive system.
 """
 
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler
-from config import BOT_TOKEN, WEBSITE_URL, WELCOME_MESSAGE, BUTTON_TEXT, FAQ_URL
-from models import create_tables, init_default_faq, User, get_db
-from admin import (admin_edit_bot, handle_admin_callback, remove_subscription_command, 
-                  is_admin, SUBSCRIPTION_PRICES)
-from faq_site import start_faq_site
-from datetime import datetime
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent, ChatMember
+from telegram.constants import ChatType
+from telegram.ext import (Application, CommandHandler, ContextTypes, MessageHandler, filters,
+                          CallbackQueryHandler, InlineQueryHandler, TypeHandler, ChatMemberHandler)
+from config import BOT_TOKEN, WELCOME_MESSAGE, WELCOME_PHOTO, BOT_MODE, WEBHOOK_URL, METRICS_PORT
+from models import init_db, init_default_faq
+import repository
+from repository import DatabaseUnavailable
+from user_buffer import user_writes
+from media import media_registry
+from catalog import get_catalog, SUPPORT_USERNAME, PLANS, SUBSCRIPTION_PRICES
+from faq_index import faq_index, display_text
+from faq_matcher import faq_matcher
+from subscription_expiry import schedule_expiry_job
+from broadcast import schedule_broadcast_job
+from admin import (admin_edit_bot, remove_subscription_command, broadcast_command,
+                   payments_command, is_admin)
+from callback_router import router
+from faq_site import start_faq_site, create_faq_app
+from flood_control import flood_control, FLOOD_CONTROL_GROUP
+from update_processor import ChatOrderedUpdateProcessor
+from metrics import InstrumentedRequest, instrument_handlers, start_metrics_server
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 def register_or_update_user(telegram_user):
-    """Register or update user in database."""
-    db = get_db()
-
-    user = db.query(User).filter(User.telegram_id == telegram_user.id).first()
-
-    if not user:
-        # Create new user
-        user = User(
-            telegram_id=telegram_user.id,
-            username=telegram_user.username,
-            first_name=telegram_user.first_name,
-            last_name=telegram_user.last_name
-        )
-        db.add(user)
+    """Queue user registration or profile update for the next batched write."""
+    user_writes.add(
+        telegram_user.id,
+        telegram_user.username,
+        telegram_user.first_name,
+        telegram_user.last_name
+    )
+
+async def track_bot_blocked(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mark a user inactive when they block the bot and active again when they unblock it."""
+    member_update = update.my_chat_member
+    if member_update.chat.type != ChatType.PRIVATE:
+        return
+    status = member_update.new_chat_member.status
+    if status == ChatMember.BANNED:
+        is_active = False
+    elif status == ChatMember.MEMBER:
+        is_active = True
     else:
-        # Update existing user
-        user.username = telegram_user.username
-        user.first_name = telegram_user.first_name
-        user.last_name = telegram_user.last_name
-        user.updated_at = datetime.utcnow()
+        return
 
-    db.commit()
-    db.close()
-    return user
+    try:
+        await repository.set_user_active(member_update.from_user.id, is_active)
+        logger.info(f"User {member_update.from_user.id} {'unblocked' if is_active else 'blocked'} the bot")
+    except Exception as e:
+        logger.error(f"Error updating active flag of user {member_update.from_user.id}: {e}")
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -53,26 +69,21 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         # Register or update user
         register_or_update_user(user)
 
-        # Create keyboard with main options
-        keyboard = [
-            [InlineKeyboardButton("🎓 Наши тарифы", callback_data="show_plans")],
-            [InlineKeyboardButton("❓ FAQ", callback_data="show_faq")],
-            [InlineKeyboardButton("👤 Мой профиль", callback_data="my_profile")],
-            [InlineKeyboardButton(BUTTON_TEXT, url=WEBSITE_URL)]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Main menu keyboard
+        reply_markup = get_catalog().main_menu.reply_markup
 
         logger.info(f"User {user.id} ({user.first_name}) started the bot")
 
         # Send photo with caption and buttons
         try:
-            with open('attached_assets/IMG_20250605_114549_367.jpg', 'rb') as photo:
-                await update.message.reply_photo(
-                    photo=photo,
-                    caption=WELCOME_MESSAGE,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
+            await media_registry.send_photo(
+                context.bot,
+                update.effective_chat.id,
+                WELCOME_PHOTO,
+                caption=WELCOME_MESSAGE,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
         except FileNotFoundError:
             # Fallback to text message if image not found
             await update.message.reply_text(
@@ -89,79 +100,33 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             "Извините, произошла ошибка. Попробуйте позже или обратитесь в поддержку."
         )
 
+@router.handler("show_plans")
 async def show_plans(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show subscription plans."""
     query = update.callback_query
-    await query.answer()
-
-    text = "🎓 **Тарифы SPEAKYZ**\n\n"
-    text += "🆓 **Базовый — Start**\n"
-    text += "✅ 2 групповых занятия в неделю\n"
-    text += "✅ Учебные материалы и доступ к платформе\n"
-    text += "✅ Домашние задания с проверкой\n"
-    text += "❌ Без разговорной практики с носителем\n"
-    text += "📚 +40–60 новых слов / месяц\n\n"
-
-    text += "⭐ **Продвинутый — Smart**\n"
-    text += "✅ 2 групповых + 1 разговорный клуб в неделю\n"
-    text += "✅ Проверка ДЗ с обратной связью\n"
-    text += "✅ Чат с преподавателем\n"
-    text += "📚 +80–120 новых слов / месяц\n"
-    text += "💰 870,000 UZS / месяц\n\n"
-
-    text += "🌟 **Премиум — Pro+**\n"
-    text += "✅ 2 индивидуальных + 2 групповых занятия\n"
-    text += "✅ Персональный преподаватель\n"
-    text += "✅ Подготовка к IELTS / TOEFL\n"
-    text += "✅ Поддержка 24/7\n"
-    text += "📚 +150–200 новых слов / месяц\n"
-    text += "💰 1,650,000 UZS / месяц\n\n"
-
-    text += "💬 **Разговорный клуб**\n"
-    text += "✅ 1 встреча в неделю\n"
-    text += "✅ Тематические дискуссии\n"
-    text += "📚 +20–30 новых слов / месяц\n"
-    text += "💰 190,000 UZS / месяц"
-
-    keyboard = [
-        [InlineKeyboardButton("💳 Купить подписку", callback_data="buy_subscription")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_caption(caption=text, reply_markup=reply_markup, parse_mode='Markdown')
 
+    screen = get_catalog().plans
+    await query.edit_message_caption(caption=screen.text, reply_markup=screen.reply_markup, parse_mode='Markdown')
+
+@router.handler("show_faq")
 async def show_faq(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show FAQ website link."""
     query = update.callback_query
-    await query.answer()
-
-    text = "❓ **Часто задаваемые вопросы**\n\n"
-    text += "Полный список ответов на популярные вопросы доступен на нашем сайте:\n"
-    text += f"{FAQ_URL}\n\n"
-    text += "Там вы найдете информацию о:\n"
-    text += "• Процессе обучения\n"
-    text += "• Тарифах и оплате\n"
-    text += "• Возврате средств\n"
-    text += "• И многое другое!"
 
-    keyboard = [
-        [InlineKeyboardButton("🌐 Открыть FAQ", url=FAQ_URL)],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_caption(caption=text, reply_markup=reply_markup, parse_mode='Markdown')
+    screen = get_catalog().faq
+    await query.edit_message_caption(caption=screen.text, reply_markup=screen.reply_markup, parse_mode='Markdown')
 
+@router.handler("my_profile")
 async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show user profile."""
     query = update.callback_query
-    await query.answer()
 
     user = query.from_user
-    db = get_db()
-    db_user = db.query(User).filter(User.telegram_id == user.id).first()
-    db.close()
+    # Make sure a just-registered user is written before reading it back
+    if user_writes.is_pending(user.id):
+        await user_writes.flush()
+    db_user = await repository.get_user(user.id)
+    catalog = get_catalog()
 
     if not db_user:
         text = "❌ Профиль не найден. Используйте /start для регистрации."
@@ -171,12 +136,7 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         text += f"Username: @{db_user.username or 'Не указан'}\n\n"
 
         if db_user.subscription_type:
-            sub_name = {
-                'start': 'Базовый (Start)',
-                'smart': 'Продвинутый (Smart)', 
-                'pro_plus': 'Премиум (Pro+)',
-                'speaking_club': 'Разговорный клуб'
-            }.get(db_user.subscription_type, db_user.subscription_type)
+            sub_name = catalog.plan_names.get(db_user.subscription_type, db_user.subscription_type)
 
             text += f"📋 Подписка: {sub_name}\n"
             if db_user.subscription_end:
@@ -186,68 +146,96 @@ async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         else:
             text += "📋 Подписка: Не активна\n"
 
-    keyboard = [
-        [InlineKeyboardButton("💳 Купить подписку", callback_data="buy_subscription")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_caption(caption=text, reply_markup=reply_markup, parse_mode='Markdown')
+    await query.edit_message_caption(caption=text, reply_markup=catalog.profile_markup, parse_mode='Markdown')
 
+@router.handler("buy_subscription")
 async def buy_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show subscription purchase options."""
     query = update.callback_query
-    await query.answer()
-
-    text = "💳 **Оплата подписки**\n\n"
-    text += "Для оплаты переведите нужную сумму на карту Humo:\n"
-    text += "`9860 3501 0188 0457`\n\n"
-    text += "**Тарифы:**\n"
-    text += "• Smart: 870,000 UZS\n"
-    text += "• Pro+: 1,650,000 UZS\n"
-    text += "• Разговорный клуб: 190,000 UZS\n\n"
-    text += "После перевода ваша подписка активируется автоматически!\n\n"
-    text += "❓ **Проблемы с оплатой?**\n"
-    text += "Обратитесь в поддержку: @Dream565758"
-
-    keyboard = [
-        [InlineKeyboardButton("🔙 Назад к тарифам", callback_data="show_plans")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_caption(caption=text, reply_markup=reply_markup, parse_mode='Markdown')
+
+    screen = get_catalog().buy
+    await query.edit_message_caption(caption=screen.text, reply_markup=screen.reply_markup, parse_mode='Markdown')
+
+@router.handler("pay")
+async def start_payment(update: Update, context: ContextTypes.DEFAULT_TYPE, plan_key) -> None:
+    """Remember the paid plan and ask for a receipt photo."""
+    query = update.callback_query
+
+    plan = next((plan for plan in PLANS if plan['key'] == plan_key), None)
+    if not plan or not SUBSCRIPTION_PRICES.get(plan_key):
+        await query.message.reply_text("❌ Этот тариф нельзя оплатить.")
+        return
+
+    context.user_data['payment_plan'] = plan_key
+    await query.message.reply_text(
+        f"🧾 Отправьте фото чека об оплате тарифа {plan['label']} "
+        f"({SUBSCRIPTION_PRICES[plan_key]:,} UZS) одним сообщением."
+    )
+
+async def receive_receipt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Turn a receipt photo into a payment claim for the admin queue."""
+    user = update.effective_user
+    plan_key = context.user_data.get('payment_plan')
+
+    if not plan_key:
+        await update.message.reply_text(
+            "Чтобы сообщить об оплате, откройте /start → 🎓 Наши тарифы → 💳 Купить подписку "
+            "и нажмите кнопку с оплаченным тарифом."
+        )
+        return
+
+    register_or_update_user(user)
+    # The payment references the user row, so write a just-registered user first
+    if user_writes.is_pending(user.id):
+        await user_writes.flush()
+
+    try:
+        payment_id = await repository.create_payment(
+            user.id, plan_key, SUBSCRIPTION_PRICES[plan_key], update.message.photo[-1].file_id
+        )
+    except DatabaseUnavailable:
+        await update.message.reply_text("❌ Сервис временно недоступен. Попробуйте позже.")
+        return
+    except Exception as e:
+        logger.error(f"Error creating payment for user {user.id}: {e}")
+        await update.message.reply_text(
+            f"❌ Не удалось сохранить чек. Попробуйте еще раз или напишите в поддержку: {SUPPORT_USERNAME}"
+        )
+        return
+
+    if payment_id is None:
+        await update.message.reply_text("❌ Профиль не найден. Используйте /start для регистрации.")
+        return
+
+    # One claim per button press, so an extra photo is not counted as a second payment
+    context.user_data.pop('payment_plan', None)
+    logger.info(f"Payment #{payment_id} ({plan_key}) submitted by user {user.id}")
+    await update.message.reply_text(
+        f"✅ Чек получен, заявка #{payment_id} отправлена на проверку.\n"
+        "Мы пришлем сообщение, как только подписка будет активирована."
+    )
 
 async def faq_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /faq command."""
-    keyboard = [
-        [InlineKeyboardButton("🌐 Открыть FAQ сайт", url=FAQ_URL)]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
+    screen = get_catalog().faq_command
     await update.message.reply_text(
-        "❓ **FAQ - Часто задаваемые вопросы**\n\nПереходите на наш сайт с полным списком ответов:",
-        reply_markup=reply_markup,
+        screen.text,
+        reply_markup=screen.reply_markup,
         parse_mode='Markdown'
     )
 
+@router.handler("back_to_main")
 async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Return to main menu from callback query."""
     query = update.callback_query
-    await query.answer()
 
     user = query.from_user
 
     # Register or update user
     register_or_update_user(user)
 
-    # Create keyboard with main options
-    keyboard = [
-        [InlineKeyboardButton("🎓 Наши тарифы", callback_data="show_plans")],
-        [InlineKeyboardButton("❓ FAQ", callback_data="show_faq")],
-        [InlineKeyboardButton("👤 Мой профиль", callback_data="my_profile")],
-        [InlineKeyboardButton(BUTTON_TEXT, url=WEBSITE_URL)]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Main menu keyboard
+    reply_markup = get_catalog().main_menu.reply_markup
 
     try:
         # Check if message has photo (caption) or text
@@ -269,14 +257,14 @@ async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         try:
             await query.delete_message()
             try:
-                with open('attached_assets/IMG_20250605_114549_367.jpg', 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=query.message.chat_id,
-                        photo=photo,
-                        caption=WELCOME_MESSAGE,
-                        reply_markup=reply_markup,
-                        parse_mode='Markdown'
-                    )
+                await media_registry.send_photo(
+                    context.bot,
+                    query.message.chat_id,
+                    WELCOME_PHOTO,
+                    caption=WELCOME_MESSAGE,
+                    reply_markup=reply_markup,
+                    parse_mode='Markdown'
+                )
             except FileNotFoundError:
                 await context.bot.send_message(
                     chat_id=query.message.chat_id,
@@ -289,55 +277,22 @@ async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             await query.message.reply_text("Произошла ошибка. Попробуйте /start")
 
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle all callback queries."""
-    query = update.callback_query
-    data = query.data
-
+    """Handle all callback queries through the callback router."""
     try:
-        # Admin callbacks
-        if data.startswith("admin_"):
-            await handle_admin_callback(update, context)
-            return
-
-        # Main bot callbacks
-        if data == "show_plans":
-            await show_plans(update, context)
-        elif data == "show_faq":
-            await show_faq(update, context)
-        elif data == "my_profile":
-            await show_profile(update, context)
-        elif data == "buy_subscription":
-            await buy_subscription(update, context)
-        elif data == "back_to_main":
-            await back_to_main(update, context)
-        else:
-            await query.answer("Неизвестная команда")
+        await router.dispatch(update, context)
     except Exception as e:
-        logger.error(f"Error in callback query handler: {e}")
-        await query.answer("Произошла ошибка. Попробуйте еще раз.")
+        logger.error(f"Error in callback query handler for {update.callback_query.data!r}: {e}")
+        # The router has already answered the query, so report the error in the chat
+        if update.effective_message:
+            await update.effective_message.reply_text("Произошла ошибка. Попробуйте еще раз.")
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /help command."""
     user = update.effective_user
-    help_text = """
-🤖 **Команды SPEAKYZ бота:**
-
-/start - Главное меню
-/faq - Часто задаваемые вопросы
-/help - Это сообщение
+    catalog = get_catalog()
 
-📞 **Поддержка:**
-@Dream565758
-
-🌐 **Сайт школы:**
-https://sites.google.com/view/wwwspeakzycom
-    """
-
-    # Add admin commands for admin users
-    if is_admin(user):
-        help_text += "\n\n🔧 **Команды администратора:**\n"
-        help_text += "/admineditbot - Панель администратора\n"
-        help_text += "/remove_subscription @username - Удалить подписку"
+    # Show admin commands to admin users
+    help_text = catalog.admin_help if is_admin(user) else catalog.help
 
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
@@ -367,14 +322,11 @@ async def add_faq_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
 
     try:
-        from models import FAQ
-        db = get_db()
-        new_faq = FAQ(question=question, answer=answer, created_by=user.id)
-        db.add(new_faq)
-        db.commit()
-        db.close()
+        await repository.add_faq(question, answer, user.id)
 
         await update.message.reply_text(f"✅ FAQ добавлен:\n\n**Вопрос:** {question}\n**Ответ:** {answer}", parse_mode='Markdown')
+    except DatabaseUnavailable:
+        await update.message.reply_text("❌ База данных недоступна.")
     except Exception as e:
         logger.error(f"Error adding FAQ: {e}")
         await update.message.reply_text("❌ Ошибка при добавлении FAQ.")
@@ -403,34 +355,139 @@ async def edit_faq_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         question = question.strip()
         answer = answer.strip()
 
-        from models import FAQ
-        db = get_db()
-        faq = db.query(FAQ).filter(FAQ.id == faq_id).first()
-
-        if not faq:
+        if not await repository.update_faq(faq_id, question, answer):
             await update.message.reply_text(f"❌ FAQ с ID {faq_id} не найден.")
-            db.close()
             return
 
-        faq.question = question
-        faq.answer = answer
-        db.commit()
-        db.close()
-
         await update.message.reply_text(f"✅ FAQ обновлен:\n\n**Вопрос:** {question}\n**Ответ:** {answer}", parse_mode='Markdown')
 
     except ValueError:
         await update.message.reply_text("❌ Неправильный ID FAQ.")
+    except DatabaseUnavailable:
+        await update.message.reply_text("❌ База данных недоступна.")
     except Exception as e:
         logger.error(f"Error editing FAQ: {e}")
         await update.message.reply_text("❌ Ошибка при редактировании FAQ.")
 
+# Telegram shows at most 50 inline results
+INLINE_RESULTS_LIMIT = 20
+
+async def inline_faq_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer inline queries (@speakyz_bot <text>) from the in-memory FAQ index."""
+    query = update.inline_query
+    text = query.query.strip()
+
+    if text:
+        matches = faq_index.search(text, limit=INLINE_RESULTS_LIMIT)
+    else:
+        matches = faq_index.entries(limit=INLINE_RESULTS_LIMIT)
+
+    results = []
+    for faq_id, question, answer in matches:
+        answer = display_text(answer)
+        results.append(InlineQueryResultArticle(
+            id=str(faq_id),
+            title=question,
+            description=answer[:100],
+            input_message_content=InputTextMessageContent(f"❓ {question}\n\n{answer}")
+        ))
+
+    await query.answer(results, cache_time=300)
+
+async def answer_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer a free-text question with the closest FAQ entry."""
+    match = faq_matcher.match(update.message.text)
+
+    if not match:
+        await update.message.reply_text(
+            "🤔 Не нашел ответа на ваш вопрос.\n\n"
+            f"Посмотрите /faq или напишите в поддержку: {SUPPORT_USERNAME}"
+        )
+        return
+
+    faq_id, question, answer, score = match
+    logger.info(f"Answered question from user {update.effective_user.id} with FAQ #{faq_id} (score {score:.2f})")
+    await update.message.reply_text(f"❓ {question}\n\n{display_text(answer)}")
+
 async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle unknown commands."""
     await update.message.reply_text(
         "Извините, я не понимаю эту команду. Используйте /start для начала или /help для получения помощи."
     )
 
+async def on_startup(application: Application) -> None:
+    """Start background workers once the event loop is running."""
+    user_writes.start()
+
+    try:
+        faq_index.build(await repository.get_active_faqs())
+        faq_matcher.build(faq_index.entries(limit=None))
+    except Exception as e:
+        logger.error(f"Error building FAQ search index: {e}")
+
+async def on_shutdown(application: Application) -> None:
+    """Flush buffered writes and release background resources when the bot stops."""
+    await user_writes.stop()
+    repository.shutdown()
+
+def build_application(request=None):
+    """
+    Create the Application with all handlers and jobs registered.
+    request replaces the Bot API transport (benchmark.py passes a stub).
+    """
+    # Create application
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor())
+        .request(request or InstrumentedRequest(connection_pool_size=256))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+
+    # Flood control runs before every other handler and can stop the update
+    application.add_handler(TypeHandler(Update, flood_control), group=FLOOD_CONTROL_GROUP)
+
+    # Add command handlers
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("faq", faq_command))
+    application.add_handler(CommandHandler("admineditbot", admin_edit_bot))
+    application.add_handler(CommandHandler("remove_subscription", remove_subscription_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("payments", payments_command))
+    application.add_handler(CommandHandler("add_faq", add_faq_command))
+    application.add_handler(CommandHandler("edit_faq", edit_faq_command))
+
+    # Block and unblock of the bot in private chats
+    application.add_handler(ChatMemberHandler(track_bot_blocked, ChatMemberHandler.MY_CHAT_MEMBER))
+
+    # Add callback query handler
+    application.add_handler(CallbackQueryHandler(handle_callback_query))
+
+    # Inline FAQ search
+    application.add_handler(InlineQueryHandler(inline_faq_search))
+
+    # Periodic jobs
+    schedule_expiry_job(application.job_queue)
+    schedule_broadcast_job(application.job_queue)
+
+    # Free-text questions in private chats are answered from the FAQ
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, answer_question
+    ))
+
+    # Receipt photos for payment claims
+    application.add_handler(MessageHandler(filters.PHOTO & filters.ChatType.PRIVATE, receive_receipt))
+
+    # Add handler for unknown commands (must be last)
+    application.add_handler(MessageHandler(filters.COMMAND, unknown_command))
+
+    # Handler latency and error metrics
+    instrument_handlers(application)
+    return application
+
 def start_bot():
     """
     Initialize and start the Telegram bot with full functionality.
@@ -441,37 +498,36 @@ def start_bot():
             logger.error("BOT_TOKEN is required to start the bot")
             return
 
+        if BOT_MODE == "webhook" and not WEBHOOK_URL:
+            logger.error("WEBHOOK_URL is required to start the bot in webhook mode")
+            return
+
         # Initialize database
-        if not create_tables():
+        if not init_db():
             logger.error("Failed to initialize database")
             return
 
         init_default_faq()
         logger.info("Database initialized successfully")
 
+        # Render static screens and keyboards once
+        get_catalog()
+
         # Start FAQ website
         start_faq_site()
+        if METRICS_PORT:
+            start_metrics_server(METRICS_PORT)
 
-        # Create application
-        application = Application.builder().token(BOT_TOKEN).build()
-
-        # Add command handlers
-        application.add_handler(CommandHandler("start", start_command))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("faq", faq_command))
-        application.add_handler(CommandHandler("admineditbot", admin_edit_bot))
-        application.add_handler(CommandHandler("remove_subscription", remove_subscription_command))
-        application.add_handler(CommandHandler("add_faq", add_faq_command))
-        application.add_handler(CommandHandler("edit_faq", edit_faq_command))
-
-        # Add callback query handler
-        application.add_handler(CallbackQueryHandler(handle_callback_query))
-
-        # Add handler for unknown commands (must be last)
-        application.add_handler(MessageHandler(filters.COMMAND, unknown_command))
-
+        application = build_application()
         logger.info("Bot handlers registered successfully")
 
+        if BOT_MODE == "webhook":
+            # Telegram updates and the FAQ site share one port
+            from webhook import run_webhook
+            logger.info("Starting SPEAKYZ bot in webhook mode...")
+            run_webhook(application, create_faq_app())
+            return
+
         # Start the bot with optimized polling settings for continuous operation
         logger.info("Starting SPEAKYZ bot polling...")
         application.run_polling(
@@ -0,0 +1,169 @@
+"""
+Broadcast engine for SPEAKYZ bot.
+Sends a message to all active users within Telegram rate limits,
+checkpointing progress so an interrupted broadcast resumes where it stopped.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.ext import ContextTypes
+from rate_limit import TokenBucket, KeyedTokenBuckets
+from metrics import registry
+import repository
+from user_buffer import user_writes
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# How often the dispatcher looks for queued broadcasts
+DISPATCH_INTERVAL = 15  # seconds
+# A running broadcast refreshes its heartbeat this often, independently of its batches
+HEARTBEAT_INTERVAL = 20  # seconds
+# A running broadcast without a heartbeat for this long is considered abandoned
+STALE_AFTER = timedelta(minutes=2)
+# Give up on a recipient after this many RetryAfter responses
+MAX_RETRIES = 5
+
+# Shared by all broadcasts of this process
+global_bucket = TokenBucket(BROADCAST_RATE)
+chat_buckets = KeyedTokenBuckets(rate=1, capacity=1)
+
+broadcast_stats = {'sent': 0, 'failed': 0, 'blocked': 0, 'retry_after': 0}
+registry.callback('bot_broadcast_messages_total', 'Broadcast deliveries by result.',
+                  lambda: broadcast_stats, type='counter', labelname='result')
+
+_running = set()  # broadcast ids being sent by this process
+_tasks = set()  # keep references so tasks are not garbage collected
+
+
+async def _heartbeat(broadcast_id):
+    """Keep the claim alive while batches are sent, however long a RetryAfter pause lasts."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            await repository.touch_broadcast(broadcast_id)
+        except Exception as e:
+            logger.warning(f"Could not refresh heartbeat of broadcast #{broadcast_id}: {e}")
+
+
+async def send_with_limits(bot, chat_id, text):
+    """
+    Send one message, respecting the global and per-chat rate limits and RetryAfter.
+    Returns 'sent', 'blocked' or 'failed'.
+    """
+    for _ in range(MAX_RETRIES):
+        await global_bucket.acquire()
+        await chat_buckets.get(chat_id).acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return 'sent'
+        except RetryAfter as e:
+            broadcast_stats['retry_after'] += 1
+            logger.warning(f"Flood control hit, pausing broadcasts for {e.retry_after}s")
+            global_bucket.pause(e.retry_after)
+        except Forbidden:
+            return 'blocked'
+        except BadRequest as e:
+            if 'chat not found' in str(e).lower():
+                return 'blocked'
+            logger.warning(f"Could not send broadcast to {chat_id}: {e}")
+            return 'failed'
+        except Exception as e:
+            logger.warning(f"Could not send broadcast to {chat_id}: {e}")
+            return 'failed'
+    return 'failed'
+
+
+async def run_broadcast(bot, broadcast):
+    """Send a claimed broadcast to all remaining recipients."""
+    broadcast_id = broadcast['id']
+    counts = {'sent': broadcast['sent'], 'failed': broadcast['failed'], 'blocked': broadcast['blocked']}
+    last_user_id = broadcast['last_user_id']
+    logger.info(f"Broadcast #{broadcast_id} started after user id {last_user_id}")
+
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    heartbeat = asyncio.get_running_loop().create_task(_heartbeat(broadcast_id))
+
+    async def send(telegram_id):
+        async with semaphore:
+            return await send_with_limits(bot, telegram_id, broadcast['text'])
+
+    # Recipients are read in short keyset-paged queries, so a broadcast never holds a
+    # pooled connection between batches; the next page is fetched while this one is sent
+    next_page = asyncio.ensure_future(repository.get_broadcast_recipients(last_user_id, BROADCAST_BATCH_SIZE))
+    try:
+        while True:
+            batch = await next_page
+            if not batch:
+                break
+            next_page = asyncio.ensure_future(
+                repository.get_broadcast_recipients(batch[-1][0], BROADCAST_BATCH_SIZE)
+            )
+
+            results = await asyncio.gather(*(send(telegram_id) for _, telegram_id in batch))
+            blocked_ids = [telegram_id for (_, telegram_id), result in zip(batch, results) if result == 'blocked']
+            for result in results:
+                counts[result] += 1
+                broadcast_stats[result] += 1
+            last_user_id = batch[-1][0]
+
+            await repository.save_broadcast_progress(
+                broadcast_id, last_user_id, counts['sent'], counts['failed'], counts['blocked'], blocked_ids
+            )
+            # Their next message must reach the database to mark them active again
+            user_writes.forget(blocked_ids)
+        await repository.finish_broadcast(broadcast_id)
+    except Exception as e:
+        # Left as 'running'; another dispatch resumes it from the checkpoint once it goes stale
+        logger.error(f"Broadcast #{broadcast_id} interrupted at user id {last_user_id}: {e}")
+        return
+    finally:
+        heartbeat.cancel()
+        next_page.cancel()
+
+    logger.info(f"Broadcast #{broadcast_id} finished: {counts}")
+    if broadcast['created_by']:
+        try:
+            await bot.send_message(
+                chat_id=broadcast['created_by'],
+                text=f"📣 Рассылка #{broadcast_id} завершена\n\n"
+                     f"✅ Доставлено: {counts['sent']}\n"
+                     f"🚫 Заблокировали бота: {counts['blocked']}\n"
+                     f"❌ Ошибки: {counts['failed']}"
+            )
+        except Exception as e:
+            logger.warning(f"Could not notify admin about broadcast #{broadcast_id}: {e}")
+
+
+async def dispatch_broadcasts(bot):
+    """Claim queued or abandoned broadcasts and start sending them."""
+    while True:
+        broadcast = await repository.claim_broadcast(datetime.utcnow() - STALE_AFTER)
+        if not broadcast:
+            return
+        if broadcast['id'] in _running:
+            continue
+        _running.add(broadcast['id'])
+        task = asyncio.get_running_loop().create_task(run_broadcast(bot, broadcast))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        task.add_done_callback(lambda _, broadcast_id=broadcast['id']: _running.discard(broadcast_id))
+
+
+async def broadcast_dispatch_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback: start queued broadcasts (including ones queued from the console)."""
+    try:
+        await dispatch_broadcasts(context.bot)
+    except Exception as e:
+        logger.error(f"Error dispatching broadcasts: {e}")
+
+
+def schedule_broadcast_job(job_queue):
+    """Poll for queued broadcasts every DISPATCH_INTERVAL seconds."""
+    if job_queue is None:
+        logger.warning("JobQueue not available, broadcasts are disabled")
+        return
+    job_queue.run_repeating(broadcast_dispatch_job, interval=DISPATCH_INTERVAL, first=5,
+                            name="dispatch_broadcasts")
@@ -0,0 +1,77 @@
+"""
+In-process caches for SPEAKYZ bot.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a fixed TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # Shared between the bot event loop and the console admin thread
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get a cached value, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop a single entry."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Get size and hit/miss counters."""
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class ContentVersion:
+    """Change counter for content that is read far more often than it is written."""
+
+    def __init__(self):
+        self.counter = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """Record that the content changed."""
+        with self._lock:
+            self.counter += 1
+
+
+# User profile records keyed by telegram_id
+profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+# Bumped on every FAQ write
+faq_version = ContentVersion()
@@ -0,0 +1,117 @@
+"""
+Callback query routing for SPEAKYZ bot.
+Handlers register against a route name; callback data is "name:arg1:arg2"
+and is dispatched with a single dictionary lookup.
+"""
+
+import logging
+from collections import namedtuple
+from telegram import Update
+from telegram.ext import ContextTypes
+from metrics import track_handler
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects callback data longer than this
+MAX_CALLBACK_DATA = 64
+SEPARATOR = ":"
+ARG_TYPES = (int, str)
+
+Route = namedtuple('Route', ['name', 'handler', 'arg_types', 'guard', 'denied_text'])
+
+
+class CallbackRouter:
+    """Registry of callback routes with typed arguments and optional access guards."""
+
+    def __init__(self):
+        self._routes = {}
+
+    def declare(self, name, *arg_types, guard=None, denied_text="❌ Нет доступа."):
+        """
+        Declare a route and its argument types without a handler yet, so data() works
+        in modules that build keyboards before the handler module is imported.
+        guard(user) must return True for the handler to run.
+        """
+        if SEPARATOR in name:
+            raise ValueError(f"Route name {name!r} must not contain {SEPARATOR!r}")
+        if any(arg_type not in ARG_TYPES for arg_type in arg_types):
+            raise ValueError(f"Route {name!r}: argument types must be int or str")
+        if name in self._routes:
+            raise ValueError(f"Route {name!r} is already registered")
+        self._routes[name] = Route(name, None, arg_types, guard, denied_text)
+
+    def handler(self, name):
+        """Register handler(update, context, *args) for a declared route."""
+        def register(handler):
+            route = self._routes.get(name)
+            if route is None:
+                raise KeyError(f"Unknown callback route {name!r}")
+            if route.handler is not None:
+                raise ValueError(f"Route {name!r} already has a handler")
+            self._routes[name] = route._replace(handler=handler)
+            return handler
+        return register
+
+    def route(self, name, *arg_types, guard=None, denied_text="❌ Нет доступа."):
+        """Declare a route and register handler(update, context, *args) for it."""
+        self.declare(name, *arg_types, guard=guard, denied_text=denied_text)
+        return self.handler(name)
+
+    def data(self, name, *args):
+        """Encode callback data for a route, checking arguments and Telegram's size limit."""
+        route = self._routes.get(name)
+        if route is None:
+            raise KeyError(f"Unknown callback route {name!r}")
+        if len(args) != len(route.arg_types):
+            raise ValueError(f"Route {name!r} takes {len(route.arg_types)} argument(s), got {len(args)}")
+
+        parts = [name]
+        for arg, arg_type in zip(args, route.arg_types):
+            if not isinstance(arg, arg_type):
+                raise TypeError(f"Route {name!r}: expected {arg_type.__name__}, got {arg!r}")
+            value = str(arg)
+            if SEPARATOR in value:
+                raise ValueError(f"Route {name!r}: argument {value!r} contains {SEPARATOR!r}")
+            parts.append(value)
+
+        data = SEPARATOR.join(parts)
+        if len(data.encode('utf-8')) > MAX_CALLBACK_DATA:
+            raise ValueError(f"Callback data {data!r} is longer than {MAX_CALLBACK_DATA} bytes")
+        return data
+
+    def parse(self, data):
+        """Decode callback data into (route, args), or None if it matches no route."""
+        name, *values = (data or "").split(SEPARATOR)
+        route = self._routes.get(name)
+        if route is None or len(values) != len(route.arg_types):
+            return None
+        try:
+            args = [arg_type(value) for arg_type, value in zip(route.arg_types, values)]
+        except ValueError:
+            return None
+        return route, args
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Answer the callback query and run the matching handler."""
+        query = update.callback_query
+        parsed = self.parse(query.data)
+        if parsed is None:
+            logger.warning(f"Unknown callback data {query.data!r} from user {query.from_user.id}")
+            await query.answer("Неизвестная команда")
+            return
+
+        route, args = parsed
+        if route.handler is None:
+            logger.error(f"Callback route {route.name!r} has no handler")
+            await query.answer("Неизвестная команда")
+            return
+        if route.guard is not None and not route.guard(query.from_user):
+            await query.answer(route.denied_text, show_alert=True)
+            return
+
+        await query.answer()
+        with track_handler(f"callback:{route.name}"):
+            await route.handler(update, context, *args)
+
+
+router = CallbackRouter()
@@ -0,0 +1,203 @@
+"""
+Message catalog for SPEAKYZ bot.
+Renders static screens and keyboards once and rebuilds them only when prices change.
+"""
+
+import logging
+from collections import namedtuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from config import WEBSITE_URL, WELCOME_MESSAGE, BUTTON_TEXT, FAQ_URL
+from callback_router import router
+
+logger = logging.getLogger(__name__)
+
+SUPPORT_USERNAME = "@Dream565758"
+CARD_NUMBER = "9860 3501 0188 0457"
+
+# Subscription prices in UZS
+SUBSCRIPTION_PRICES = {
+    "start": 0,  # Free basic plan
+    "smart": 870000,
+    "pro_plus": 1650000,
+    "speaking_club": 190000
+}
+
+# Routes of the user screens; their handlers are registered in bot.py
+router.declare("show_plans")
+router.declare("show_faq")
+router.declare("my_profile")
+router.declare("buy_subscription")
+router.declare("back_to_main")
+router.declare("pay", str)
+
+# Single definition of all plans; prices come from SUBSCRIPTION_PRICES
+PLANS = [
+    {
+        'key': 'start',
+        'emoji': '🆓',
+        'title': 'Базовый — Start',
+        'label': 'Start',
+        'profile_name': 'Базовый (Start)',
+        'features': [
+            "✅ 2 групповых занятия в неделю",
+            "✅ Учебные материалы и доступ к платформе",
+            "✅ Домашние задания с проверкой",
+            "❌ Без разговорной практики с носителем",
+            "📚 +40–60 новых слов / месяц",
+        ],
+    },
+    {
+        'key': 'smart',
+        'emoji': '⭐',
+        'title': 'Продвинутый — Smart',
+        'label': 'Smart',
+        'profile_name': 'Продвинутый (Smart)',
+        'features': [
+            "✅ 2 групповых + 1 разговорный клуб в неделю",
+            "✅ Проверка ДЗ с обратной связью",
+            "✅ Чат с преподавателем",
+            "📚 +80–120 новых слов / месяц",
+        ],
+    },
+    {
+        'key': 'pro_plus',
+        'emoji': '🌟',
+        'title': 'Премиум — Pro+',
+        'label': 'Pro+',
+        'profile_name': 'Премиум (Pro+)',
+        'features': [
+            "✅ 2 индивидуальных + 2 групповых занятия",
+            "✅ Персональный преподаватель",
+            "✅ Подготовка к IELTS / TOEFL",
+            "✅ Поддержка 24/7",
+            "📚 +150–200 новых слов / месяц",
+        ],
+    },
+    {
+        'key': 'speaking_club',
+        'emoji': '💬',
+        'title': 'Разговорный клуб',
+        'label': 'Разговорный клуб',
+        'profile_name': 'Разговорный клуб',
+        'features': [
+            "✅ 1 встреча в неделю",
+            "✅ Тематические дискуссии",
+            "📚 +20–30 новых слов / месяц",
+        ],
+    },
+]
+
+Screen = namedtuple('Screen', ['text', 'reply_markup'])
+
+
+def format_price(price):
+    """Format a price in UZS, e.g. 870,000 UZS."""
+    return f"{price:,} UZS"
+
+
+class Catalog:
+    """All static bot screens, rendered for one set of prices."""
+
+    def __init__(self, prices):
+        self.prices = dict(prices)
+        self.plan_names = {plan['key']: plan['profile_name'] for plan in PLANS}
+
+        self.main_menu = Screen(WELCOME_MESSAGE, InlineKeyboardMarkup([
+            [InlineKeyboardButton("🎓 Наши тарифы", callback_data=router.data("show_plans"))],
+            [InlineKeyboardButton("❓ FAQ", callback_data=router.data("show_faq"))],
+            [InlineKeyboardButton("👤 Мой профиль", callback_data=router.data("my_profile"))],
+            [InlineKeyboardButton(BUTTON_TEXT, url=WEBSITE_URL)]
+        ]))
+        self.plans = Screen(self._render_plans(), InlineKeyboardMarkup([
+            [InlineKeyboardButton("💳 Купить подписку", callback_data=router.data("buy_subscription"))],
+            [InlineKeyboardButton("🔙 Назад", callback_data=router.data("back_to_main"))]
+        ]))
+        self.buy = Screen(self._render_buy(), InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"🧾 Я оплатил {plan['label']}", callback_data=router.data("pay", plan['key']))]
+            for plan in PLANS if self.prices.get(plan['key'])
+        ] + [
+            [InlineKeyboardButton("🔙 Назад к тарифам", callback_data=router.data("show_plans"))]
+        ]))
+        self.faq = Screen(self._render_faq(), InlineKeyboardMarkup([
+            [InlineKeyboardButton("🌐 Открыть FAQ", url=FAQ_URL)],
+            [InlineKeyboardButton("🔙 Назад", callback_data=router.data("back_to_main"))]
+        ]))
+        self.faq_command = Screen(
+            "❓ **FAQ - Часто задаваемые вопросы**\n\nПереходите на наш сайт с полным списком ответов:",
+            InlineKeyboardMarkup([[InlineKeyboardButton("🌐 Открыть FAQ сайт", url=FAQ_URL)]])
+        )
+        self.profile_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("💳 Купить подписку", callback_data=router.data("buy_subscription"))],
+            [InlineKeyboardButton("🔙 Назад", callback_data=router.data("back_to_main"))]
+        ])
+        self.help = self._render_help()
+        self.admin_help = self.help + (
+            "\n\n🔧 **Команды администратора:**\n"
+            "/admineditbot - Панель администратора\n"
+            "/remove_subscription @username - Удалить подписку\n"
+            "/broadcast Текст - Рассылка всем пользователям\n"
+            "/payments - Платежи на проверке"
+        )
+
+    def _render_plans(self):
+        sections = []
+        for plan in PLANS:
+            lines = [f"{plan['emoji']} **{plan['title']}**"] + plan['features']
+            price = self.prices.get(plan['key'])
+            if price:
+                lines.append(f"💰 {format_price(price)} / месяц")
+            sections.append("\n".join(lines))
+        return "🎓 **Тарифы SPEAKYZ**\n\n" + "\n\n".join(sections)
+
+    def _render_buy(self):
+        paid_plans = "\n".join(
+            f"• {plan['label']}: {format_price(self.prices[plan['key']])}"
+            for plan in PLANS if self.prices.get(plan['key'])
+        )
+        return (
+            "💳 **Оплата подписки**\n\n"
+            "Для оплаты переведите нужную сумму на карту Humo:\n"
+            f"`{CARD_NUMBER}`\n\n"
+            "**Тарифы:**\n"
+            f"{paid_plans}\n\n"
+            "После перевода нажмите кнопку с оплаченным тарифом и отправьте фото чека. "
+            "Подписка активируется сразу после проверки платежа.\n\n"
+            "❓ **Проблемы с оплатой?**\n"
+            f"Обратитесь в поддержку: {SUPPORT_USERNAME}"
+        )
+
+    def _render_faq(self):
+        return (
+            "❓ **Часто задаваемые вопросы**\n\n"
+            "Полный список ответов на популярные вопросы доступен на нашем сайте:\n"
+            f"{FAQ_URL}\n\n"
+            "Там вы найдете информацию о:\n"
+            "• Процессе обучения\n"
+            "• Тарифах и оплате\n"
+            "• Возврате средств\n"
+            "• И многое другое!"
+        )
+
+    def _render_help(self):
+        return (
+            "\n🤖 **Команды SPEAKYZ бота:**\n\n"
+            "/start - Главное меню\n"
+            "/faq - Часто задаваемые вопросы\n"
+            "/help - Это сообщение\n\n"
+            "📞 **Поддержка:**\n"
+            f"{SUPPORT_USERNAME}\n\n"
+            "🌐 **Сайт школы:**\n"
+            f"{WEBSITE_URL}\n"
+        )
+
+
+_catalog = None
+
+
+def get_catalog():
+    """Get the current catalog, rebuilding it if subscription prices changed."""
+    global _catalog
+    if _catalog is None or _catalog.prices != SUBSCRIPTION_PRICES:
+        _catalog = Catalog(SUBSCRIPTION_PRICES)
+        logger.info("Message catalog built")
+    return _catalog
@@ -37,6 +37,33 @@ def get_faq_url():
 
 FAQ_URL = get_faq_url()
 
+# Update delivery: "polling" or "webhook" (webhook serves the FAQ site on the same port)
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if os.getenv("RENDER") else "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", os.getenv("RENDER_EXTERNAL_URL"))
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+PORT = int(os.getenv("PORT", 8080))
+
+# FAQ site server: "development" (Flask server in a thread) or "production" (gunicorn workers)
+FAQ_SERVER_MODE = os.getenv("FAQ_SERVER_MODE", "development")
+# Each worker opens its own pool of DB_POOL_SIZE connections, so keep this small
+FAQ_WORKERS = int(os.getenv("FAQ_WORKERS", 2))
+FAQ_THREADS = int(os.getenv("FAQ_THREADS", 4))
+FAQ_KEEPALIVE = int(os.getenv("FAQ_KEEPALIVE", 5))  # seconds
+FAQ_GRACEFUL_TIMEOUT = int(os.getenv("FAQ_GRACEFUL_TIMEOUT", 30))  # seconds
+
+# Prometheus metrics: /metrics on the FAQ site when it runs inside the bot process and
+# METRICS_TOKEN is set (the site is public). With FAQ_SERVER_MODE=production (gunicorn) or Render polling, METRICS_PORT is the only
+# metrics endpoint; it listens on METRICS_HOST (localhost by default). Optional bearer token.
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# SQL profiling (see query_profiler.py): off unless DB_PROFILE=1
+DB_PROFILE = os.getenv("DB_PROFILE", "").lower() in ("1", "true", "yes")
+DB_SLOW_QUERY_MS = int(os.getenv("DB_SLOW_QUERY_MS", 200))
+DB_MAX_QUERIES_PER_UPDATE = int(os.getenv("DB_MAX_QUERIES_PER_UPDATE", 10))
+
 # Welcome message configuration
 WELCOME_MESSAGE = """
 🎉 Добро пожаловать в SPEAKYZ - Онлайн-школу английского языка! 🎉
@@ -59,3 +86,44 @@ WELCOME_MESSAGE = """
 """
 
 BUTTON_TEXT = "🌐 Перейти на сайт SPEAKYZ"
+
+WELCOME_PHOTO = "attached_assets/IMG_20250605_114549_367.jpg"
+
+# Write-behind user profile buffer
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", 5))  # seconds
+USER_FLUSH_BATCH_SIZE = int(os.getenv("USER_FLUSH_BATCH_SIZE", 500))
+USER_BUFFER_MAX_PENDING = int(os.getenv("USER_BUFFER_MAX_PENDING", 10000))  # oldest changes dropped beyond this
+USER_FLUSH_MAX_BACKOFF = float(os.getenv("USER_FLUSH_MAX_BACKOFF", 60))  # seconds between retries after failures
+
+# Minimum cosine similarity for answering a free-text question from the FAQ
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", 0.3))
+
+# Subscription expiry job
+SUBSCRIPTION_EXPIRY_INTERVAL = int(os.getenv("SUBSCRIPTION_EXPIRY_INTERVAL", 600))  # seconds
+SUBSCRIPTION_EXPIRY_BATCH_SIZE = int(os.getenv("SUBSCRIPTION_EXPIRY_BATCH_SIZE", 500))
+
+# Broadcasts: Telegram allows about 30 messages per second in total and 1 per second per chat
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))  # messages per second
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 10))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", 100))  # recipients per checkpoint
+
+# User profile cache
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 300))  # seconds
+
+# Admin statistics; write paths keep the cached numbers current in between refreshes
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", 300))  # seconds
+
+# Flood control in front of all handlers
+FLOOD_USER_RATE = float(os.getenv("FLOOD_USER_RATE", 1))  # updates per second per user
+FLOOD_USER_BURST = int(os.getenv("FLOOD_USER_BURST", 5))
+FLOOD_GLOBAL_RATE = float(os.getenv("FLOOD_GLOBAL_RATE", 50))  # updates per second in total
+FLOOD_GLOBAL_BURST = int(os.getenv("FLOOD_GLOBAL_BURST", 100))
+FLOOD_WARN_INTERVAL = float(os.getenv("FLOOD_WARN_INTERVAL", 10))  # seconds between "please wait" replies
+FLOOD_MAX_USERS = int(os.getenv("FLOOD_MAX_USERS", 10000))  # users tracked at once
+
+# Concurrent update processing; updates of one chat are always handled in order
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 32))  # handlers running at once
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", 512))  # running + waiting for their chat
+UPDATE_MAX_PENDING_PER_CHAT = int(os.getenv("UPDATE_MAX_PENDING_PER_CHAT", 20))
+UPDATE_MAX_WAITING = int(os.getenv("UPDATE_MAX_WAITING", 512))  # waiting beyond UPDATE_MAX_PENDING; more are shed
@@ -4,11 +4,16 @@ Console administration tools for SPEAKYZ bot.
 Allows managing subscriptions and users via console commands.
 """
 
-import sys
 import threading
 import time
-from models import User, get_db
-from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from models import User, Broadcast, get_db
+from cache import profile_cache
+from stats import admin_stats, compute_stats, estimate_mrr
+from catalog import SUBSCRIPTION_PRICES
+from repository import USER_LIST_COLUMNS, SUBSCRIPTION_PERIOD, user_filters, count_users
+import user_csv
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,31 +25,76 @@ def console_help():
     print("="*50)
     print("Available commands:")
     print("  help - Show this help")
-    print("  users - List all users")
+    print("  users [--after <id>] [--filter plan=<type|none>] [--search <name>] - List users")
     print("  stats - Show bot statistics")
     print("  add_sub <username> <type> - Add subscription")
     print("  remove_sub <username> - Remove subscription")
+    print("  broadcast <text> - Send a message to all active users")
+    print("  export_users <file> - Export all users to CSV")
+    print("  import_subs <file> [--dry-run] - Set subscriptions from CSV (telegram_id/username, subscription_type[, subscription_end])")
     print("  exit - Exit console")
     print("="*50)
 
-def list_users():
-    """List all users."""
+USERS_PAGE_SIZE = 10
+
+def parse_users_args(args):
+    """
+    Parse `users` arguments into (after_id, plan, search). Raises ValueError on bad input.
+    --after <id> continues after a user id (keyset); --search takes every word up to the next option.
+    """
+    after_id, plan, search = 0, None, None
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '--filter' and args:
+            key, _, value = args.pop(0).partition('=')
+            if key != 'plan' or not value:
+                raise ValueError("only --filter plan=<type|none> is supported")
+            plan = value
+        elif arg == '--search' and args:
+            words = []
+            while args and not args[0].startswith('--'):
+                words.append(args.pop(0))
+            if not words:
+                raise ValueError("--search needs a name")
+            search = " ".join(words)
+        elif arg == '--after' and args and args[0].isdigit():
+            after_id = int(args.pop(0))
+        else:
+            raise ValueError(f"unexpected argument: {arg}")
+    return after_id, plan, search
+
+def list_users(after_id=0, plan=None, search=None):
+    """List one page of users, optionally filtered by plan and searched by name."""
     db = get_db()
     if not db:
         print("❌ Database not available")
         return
     
     try:
-        users = db.query(User).all()
-        print(f"\n📋 Total users: {len(users)}")
+        conditions = user_filters(plan, search)
+        total = count_users(db, plan, search)
+        
+        # Keyset: an index range scan that costs the same for any position
+        stmt = select(*USER_LIST_COLUMNS).where(*conditions, User.id > after_id) \
+            .order_by(User.id).limit(USERS_PAGE_SIZE + 1)
+        rows = db.execute(stmt).all()
+        has_next = len(rows) > USERS_PAGE_SIZE
+        rows = rows[:USERS_PAGE_SIZE]
+        
+        position = f"after #{after_id}" if after_id else "first page"
+        print(f"\n📋 Users: {total} ({position})")
         print("-" * 60)
         
-        for user in users[:10]:  # Show first 10 users
+        for user in rows:
             sub_info = f" ({user.subscription_type})" if user.subscription_type else " (no subscription)"
-            print(f"👤 {user.first_name} @{user.username}{sub_info}")
+            print(f"👤 #{user.id} {user.first_name} @{user.username}{sub_info}")
         
-        if len(users) > 10:
-            print(f"... and {len(users) - 10} more users")
+        if not rows:
+            print("No users on this page")
+        elif has_next:
+            filters = (f" --filter plan={plan}" if plan else "") + (f" --search {search}" if search else "")
+            print(f"... next page: users --after {rows[-1].id}{filters}")
             
         db.close()
     except Exception as e:
@@ -61,14 +111,23 @@ def show_stats():
         return
     
     try:
-        total_users = db.query(User).count()
-        active_subs = db.query(User).filter(User.subscription_type.isnot(None)).count()
+        stats = admin_stats.get()
+        if stats is None:
+            stats = compute_stats(db)
+            admin_stats.set(stats)
+        total_users = stats['total_users']
+        active_subs = stats['active_subs']
         
         print(f"\n📊 SPEAKYZ Bot Statistics")
         print("-" * 30)
         print(f"👥 Total users: {total_users}")
+        print(f"🆕 New today: {stats['new_today']}, this week: {stats['new_week']}")
         print(f"💰 Active subscriptions: {active_subs}")
+        for plan, count in sorted(stats['plans'].items()):
+            print(f"   {plan}: {count}")
         print(f"📈 Subscription rate: {(active_subs/total_users*100):.1f}%" if total_users > 0 else "📈 Subscription rate: 0%")
+        print(f"💵 Estimated MRR: {estimate_mrr(stats, SUBSCRIPTION_PRICES):,} UZS")
+        print(f"❓ FAQ entries: {stats['faq_count']}")
         
         db.close()
     except Exception as e:
@@ -90,17 +149,21 @@ def add_subscription(username, sub_type):
         return
     
     try:
-        user = db.query(User).filter(User.username == username.replace('@', '')).first()
+        user = db.query(User).filter(func.lower(User.username) == username.replace('@', '').lower()).first()
         if not user:
             print(f"❌ User @{username} not found")
             db.close()
             return
         
+        old_type = user.subscription_type
         user.subscription_type = sub_type
-        user.subscription_end = datetime.utcnow() + timedelta(days=30)
+        user.subscription_end = datetime.utcnow() + SUBSCRIPTION_PERIOD
         user.updated_at = datetime.utcnow()
         
+        telegram_id = user.telegram_id
         db.commit()
+        profile_cache.invalidate(telegram_id)
+        admin_stats.change_subscription(old_type, sub_type)
         db.close()
         
         print(f"✅ Added {sub_type} subscription to @{username}")
@@ -119,18 +182,22 @@ def remove_subscription(username):
         return
     
     try:
-        user = db.query(User).filter(User.username == username.replace('@', '')).first()
+        user = db.query(User).filter(func.lower(User.username) == username.replace('@', '').lower()).first()
         if not user:
             print(f"❌ User @{username} not found")
             db.close()
             return
         
+        old_type = user.subscription_type
         user.subscription_type = None
         user.subscription_end = None
         user.speaking_clubs_count = 0
         user.updated_at = datetime.utcnow()
         
+        telegram_id = user.telegram_id
         db.commit()
+        profile_cache.invalidate(telegram_id)
+        admin_stats.change_subscription(old_type, None)
         db.close()
         
         print(f"✅ Removed subscription from @{username}")
@@ -141,6 +208,73 @@ def remove_subscription(username):
         if db:
             db.close()
 
+def queue_broadcast(text):
+    """Queue a broadcast; the running bot picks it up and sends it."""
+    db = get_db()
+    if not db:
+        print("❌ Database not available")
+        return
+    
+    try:
+        broadcast = Broadcast(text=text, status='pending')
+        db.add(broadcast)
+        db.commit()
+        broadcast_id = broadcast.id
+        db.close()
+        
+        print(f"✅ Broadcast #{broadcast_id} queued, the bot will start sending it shortly")
+        
+    except Exception as e:
+        logger.error(f"Error queuing broadcast: {e}")
+        print(f"❌ Error: {e}")
+        if db:
+            db.close()
+
+def export_users(path):
+    """Export all users to a CSV file."""
+    try:
+        started = time.monotonic()
+        count = user_csv.export_users(path)
+        print(f"✅ Exported {count} users to {path} in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"Error exporting users: {e}")
+        print(f"❌ Error: {e}")
+
+def import_subscriptions(path, dry_run=False):
+    """Set subscriptions from a CSV file in one transaction."""
+    try:
+        rows, errors = user_csv.read_subscriptions(path)
+    except OSError as e:
+        print(f"❌ Cannot read {path}: {e}")
+        return
+    
+    if errors:
+        print(f"❌ {len(errors)} invalid row(s), nothing imported:")
+        for error in errors[:20]:
+            print(f"   {error}")
+        if len(errors) > 20:
+            print(f"   ... and {len(errors) - 20} more")
+        return
+    
+    try:
+        started = time.monotonic()
+        summary = user_csv.import_subscriptions(rows.values(), dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"Error importing subscriptions: {e}")
+        print(f"❌ Error, nothing imported: {e}")
+        return
+    
+    print(f"\n{'🔎 Dry run' if dry_run else '✅ Imported'}: {summary['rows']} rows in {time.monotonic() - started:.1f}s")
+    print(f"💰 Subscriptions set: {summary['updated']}")
+    for plan, count in sorted(summary['plans'].items()):
+        print(f"   {plan}: {count}")
+    print(f"🗑 Subscriptions removed: {summary['removed']}")
+    if summary['unmatched']:
+        print(f"❓ Users not found: {len(summary['unmatched'])} (CSV lines {', '.join(map(str, summary['unmatched'][:20]))}"
+              f"{', ...' if len(summary['unmatched']) > 20 else ''})")
+    if dry_run:
+        print("Nothing was changed. Run again without --dry-run to apply.")
+
 def process_console_command(command):
     """Process console command."""
     parts = command.strip().split()
@@ -152,7 +286,11 @@ def process_console_command(command):
     if cmd == 'help':
         console_help()
     elif cmd == 'users':
-        list_users()
+        try:
+            list_users(*parse_users_args(parts[1:]))
+        except ValueError as e:
+            print(f"❌ {e}")
+            print("Usage: users [--after <id>] [--filter plan=<type|none>] [--search <name>]")
     elif cmd == 'stats':
         show_stats()
     elif cmd == 'add_sub':
@@ -165,6 +303,23 @@ def process_console_command(command):
             remove_subscription(parts[1])
         else:
             print("Usage: remove_sub <username>")
+    elif cmd == 'broadcast':
+        text = command.strip().split(maxsplit=1)
+        if len(text) >= 2:
+            queue_broadcast(text[1])
+        else:
+            print("Usage: broadcast <text>")
+    elif cmd == 'export_users':
+        if len(parts) >= 2:
+            export_users(parts[1])
+        else:
+            print("Usage: export_users <file>")
+    elif cmd == 'import_subs':
+        args = [arg for arg in parts[1:] if arg != '--dry-run']
+        if args:
+            import_subscriptions(args[0], dry_run='--dry-run' in parts)
+        else:
+            print("Usage: import_subs <file> [--dry-run]")
     elif cmd in ['exit', 'quit']:
         print("👋 Exiting admin console...")
         return False
@@ -0,0 +1,155 @@
+"""
+In-memory inverted index over FAQ entries for SPEAKYZ bot.
+Lets inline queries find FAQ answers without touching the database.
+"""
+
+import bisect
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Frequent Russian and English words that carry no meaning for search
+STOPWORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если
+уже или ни быть был него до вас нибудь опять уж вам ведь там потом себя ничего ей
+может они тут где есть надо ней для мы тебя их чем была сам чтобы без будто чего раз
+тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом
+один почти мой тем чтоб нее сейчас были куда зачем всех никогда можно при наконец два
+об другой хоть после над больше тот через эти нас про всего них какая много разве
+три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более
+всегда конечно всю между
+the a an and or of to in on for is are be it how what do does can i you we
+""".split())
+
+# Common Russian inflection endings, longest first. Stripping them from query
+# tokens lets prefix matching find other forms of the same word.
+RU_ENDINGS = sorted("""
+иями ями ами ого его ому ему ыми ими ться ются ится ется ешь ишь ите ете
+ать ять ить еть уть ает яет ит ет ут ют ат ят ла ли ло
+ая яя ое ее ие ые ой ей ий ый ую юю ов ев ам ям ах ях ом ем ию ья ье
+а я о е и ы у ю ь
+""".split(), key=len, reverse=True)
+MIN_STEM_LENGTH = 4
+
+# Question words weigh more than answer words
+QUESTION_WEIGHT = 2
+ANSWER_WEIGHT = 1
+
+
+def tokenize(text):
+    """Split text into normalized search tokens (lowercase, ё folded into е, no stopwords)."""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower().replace('ё', 'е')):
+        if len(token) > 1 and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def stem(token):
+    """Strip one common Russian ending, keeping at least MIN_STEM_LENGTH characters."""
+    for ending in RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM_LENGTH:
+            return token[:-len(ending)]
+    return token
+
+
+def display_text(text):
+    """Turn literal \\n sequences stored in FAQ rows into real line breaks."""
+    return text.replace('\\n', '\n')
+
+
+class FAQIndex:
+    """Inverted index from terms to FAQ ids with prefix matching."""
+
+    def __init__(self):
+        self._postings = {}  # term -> {faq_id: weight}
+        self._terms = []  # sorted terms, for prefix range lookups
+        self._docs = {}  # faq_id -> (question, answer)
+        self._doc_terms = {}  # faq_id -> set of terms, for removal
+
+    def __len__(self):
+        return len(self._docs)
+
+    def build(self, faqs):
+        """Rebuild the index from FAQ rows."""
+        self._postings.clear()
+        self._terms.clear()
+        self._docs.clear()
+        self._doc_terms.clear()
+        for faq in faqs:
+            self.add(faq.id, faq.question, faq.answer)
+        logger.info(f"FAQ search index built with {len(self._docs)} entries")
+
+    def add(self, faq_id, question, answer):
+        """Add or replace a FAQ entry."""
+        if faq_id in self._docs:
+            self.remove(faq_id)
+
+        weights = {}
+        for token in tokenize(question):
+            weights[token] = weights.get(token, 0) + QUESTION_WEIGHT
+        for token in tokenize(display_text(answer)):
+            weights[token] = weights.get(token, 0) + ANSWER_WEIGHT
+
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[faq_id] = weight
+
+        self._docs[faq_id] = (question, answer)
+        self._doc_terms[faq_id] = set(weights)
+
+    def remove(self, faq_id):
+        """Remove a FAQ entry if present."""
+        self._docs.pop(faq_id, None)
+        for term in self._doc_terms.pop(faq_id, ()):
+            postings = self._postings[term]
+            postings.pop(faq_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + '\uffff')
+        return self._terms[start:end]
+
+    def search(self, text, limit=10):
+        """
+        Find FAQ entries matching text. Query tokens are stemmed and matched
+        as prefixes, so "оплатить" and "оплат" both find "оплата".
+        Returns a list of (faq_id, question, answer), best matches first.
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+
+        scores = {}
+        matched = {}
+        for token in set(tokens):
+            hits = {}
+            for term in self._prefix_terms(stem(token)):
+                # Exact matches beat prefix matches
+                boost = 2 if term == token else 1
+                for faq_id, weight in self._postings[term].items():
+                    hits[faq_id] = max(hits.get(faq_id, 0), weight * boost)
+            for faq_id, score in hits.items():
+                scores[faq_id] = scores.get(faq_id, 0) + score
+                matched[faq_id] = matched.get(faq_id, 0) + 1
+
+        # Entries matching more of the query first, then by score
+        ranked = sorted(scores, key=lambda faq_id: (matched[faq_id], scores[faq_id]), reverse=True)
+        return [(faq_id, *self._docs[faq_id]) for faq_id in ranked[:limit]]
+
+    def entries(self, limit=10):
+        """Get the first FAQ entries by id (all of them if limit is None)."""
+        return [(faq_id, *self._docs[faq_id]) for faq_id in sorted(self._docs)[:limit]]
+
+
+faq_index = FAQIndex()
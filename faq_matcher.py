@@ -0,0 +1,97 @@
+"""
+Free-text question answering for SPEAKYZ bot.
+Ranks FAQ entries against a user's message with TF-IDF cosine similarity.
+"""
+
+import logging
+import math
+from cache import faq_version
+from config import FAQ_MATCH_THRESHOLD
+from faq_index import faq_index, tokenize, stem, QUESTION_WEIGHT
+
+logger = logging.getLogger(__name__)
+
+
+def _term_counts(text, weight=1, counts=None):
+    counts = {} if counts is None else counts
+    for token in tokenize(text):
+        term = stem(token)
+        counts[term] = counts.get(term, 0) + weight
+    return counts
+
+
+class FAQMatcher:
+    """
+    TF-IDF model over FAQ entries stored as a sparse term -> [(faq_id, weight)] matrix.
+    Scoring touches only the columns of the query's terms.
+    """
+
+    def __init__(self):
+        self._matrix = {}  # term -> list of (faq_id, L2-normalized tf-idf weight)
+        self._idf = {}
+        self._docs = {}  # faq_id -> (question, answer)
+        self._version = None
+
+    def build(self, entries):
+        """Precompute the TF-IDF matrix from (faq_id, question, answer) entries."""
+        doc_counts = {}
+        self._docs = {}
+        for faq_id, question, answer in entries:
+            counts = _term_counts(question, QUESTION_WEIGHT)
+            doc_counts[faq_id] = _term_counts(answer, counts=counts)
+            self._docs[faq_id] = (question, answer)
+
+        document_frequency = {}
+        for counts in doc_counts.values():
+            for term in counts:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        total = len(doc_counts)
+        self._idf = {
+            term: math.log((1 + total) / (1 + df)) + 1
+            for term, df in document_frequency.items()
+        }
+
+        self._matrix = {}
+        for faq_id, counts in doc_counts.items():
+            vector = {term: (1 + math.log(tf)) * self._idf[term] for term, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+            for term, weight in vector.items():
+                self._matrix.setdefault(term, []).append((faq_id, weight / norm))
+
+        self._version = faq_version.counter
+        logger.info(f"FAQ matcher built over {total} entries and {len(self._matrix)} terms")
+
+    def _ensure_current(self):
+        # Rebuild only when FAQ rows changed since the last build
+        if self._version != faq_version.counter:
+            self.build(faq_index.entries(limit=None))
+
+    def match(self, text, threshold=FAQ_MATCH_THRESHOLD):
+        """
+        Find the FAQ entry most similar to text.
+        Returns (faq_id, question, answer, score), or None if nothing scores above threshold.
+        """
+        self._ensure_current()
+
+        query = {term: 1 + math.log(tf) for term, tf in _term_counts(text).items()
+                 if term in self._idf}
+        if not query:
+            return None
+        for term in query:
+            query[term] *= self._idf[term]
+        norm = math.sqrt(sum(w * w for w in query.values()))
+
+        scores = {}
+        for term, query_weight in query.items():
+            for faq_id, doc_weight in self._matrix[term]:
+                scores[faq_id] = scores.get(faq_id, 0.0) + query_weight * doc_weight
+
+        faq_id = max(scores, key=scores.get)
+        score = scores[faq_id] / norm
+        if score < threshold:
+            return None
+        return (faq_id, *self._docs[faq_id], score)
+
+
+faq_matcher = FAQMatcher()
@@ -0,0 +1,57 @@
+"""
+Production server for the SPEAKYZ FAQ site.
+Runs the Flask app under gunicorn in a separate multi-worker process.
+"""
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+from config import PORT, FAQ_WORKERS, FAQ_THREADS, FAQ_KEEPALIVE, FAQ_GRACEFUL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_process = None
+
+
+def start_faq_server(port=PORT):
+    """Start gunicorn serving faq_site in its own process."""
+    global _process
+    if _process and _process.poll() is None:
+        return _process
+
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--chdir", os.path.dirname(os.path.abspath(__file__)),
+        "--bind", f"0.0.0.0:{port}",
+        "--workers", str(FAQ_WORKERS),
+        # Threaded workers so keep-alive connections do not pin a whole process
+        "--worker-class", "gthread",
+        "--threads", str(FAQ_THREADS),
+        "--keep-alive", str(FAQ_KEEPALIVE),
+        "--graceful-timeout", str(FAQ_GRACEFUL_TIMEOUT),
+        "--access-logfile", "-",
+        # Workers have no bot metrics; the bot process serves them on METRICS_PORT
+        "faq_site:create_faq_app(metrics=False)",
+    ]
+    _process = subprocess.Popen(command)
+    logger.info(f"FAQ server started on port {port} with {FAQ_WORKERS} workers (pid {_process.pid})")
+    return _process
+
+
+def stop_faq_server():
+    """Stop gunicorn, letting in-flight requests finish first."""
+    global _process
+    if not _process or _process.poll() is not None:
+        return
+
+    _process.send_signal(signal.SIGTERM)
+    try:
+        _process.wait(timeout=FAQ_GRACEFUL_TIMEOUT + 5)
+    except subprocess.TimeoutExpired:
+        logger.warning("FAQ server did not stop in time, killing it")
+        _process.kill()
+        _process.wait()
+    logger.info("FAQ server stopped")
+    _process = None
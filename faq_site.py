@@ -3,13 +3,43 @@ FAQ website for SPEAKYZ bot system.
 Provides web interface for FAQ entries.
 """
 
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, Response, request
+from sqlalchemy import func
 from models import FAQ, get_db
+from cache import faq_version
+from metrics import registry, authorized, CONTENT_TYPE
+from config import METRICS_TOKEN
+from datetime import timezone
+import gzip
+import hashlib
+import json
 import threading
+import time
 import logging
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
+# Content encodings of the pre-rendered FAQ page, in order of preference
+PAGE_ENCODINGS = (['br'] if brotli else []) + ['gzip', 'identity']
+
+# /api/faq paging and field selection
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 200
+API_FIELDS = {'id': FAQ.id, 'question': FAQ.question, 'answer': FAQ.answer}
+
+# Browsers and proxies may reuse a FAQ response for this many seconds before revalidating
+FAQ_CACHE_MAX_AGE = 60
+# The FAQ version is re-read at least this often, for edits made by other processes
+FAQ_VERSION_TTL = 10  # seconds
+
+_version_state = {'counter': None, 'checked': 0.0, 'etag': None, 'last_modified': None}
+
 FAQ_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="ru">
@@ -208,62 +238,255 @@ FAQ_TEMPLATE = """
 </html>
 """
 
-def create_faq_app():
-    """Create Flask app for FAQ website."""
+def get_faq_version():
+    """
+    Get (etag, last_modified) for the current FAQ content.
+    Both come from the database only, so every process and worker agrees on them.
+    The query runs after a local FAQ change or every FAQ_VERSION_TTL seconds.
+    """
+    counter = faq_version.counter
+    now = time.monotonic()
+    if _version_state['counter'] == counter and now - _version_state['checked'] < FAQ_VERSION_TTL:
+        return _version_state['etag'], _version_state['last_modified']
+
+    db = get_db()
+    if not db:
+        return None, None
+
+    try:
+        # Inactive rows count too: deactivating an entry also moves updated_at
+        max_updated, total, active = db.query(
+            func.max(FAQ.updated_at), func.count(FAQ.id), func.count(FAQ.id).filter(FAQ.is_active == True)
+        ).one()
+        db.close()
+    except Exception as e:
+        logger.error(f"Error fetching FAQ version: {e}")
+        if db:
+            db.close()
+        return None, None
+
+    last_modified = max_updated.replace(microsecond=0, tzinfo=timezone.utc) if max_updated else None
+    version = f"{max_updated}|{total}|{active}"
+    etag = hashlib.sha1(version.encode()).hexdigest()[:20]
+
+    _version_state.update(counter=counter, checked=now, etag=etag, last_modified=last_modified)
+    return etag, last_modified
+
+def is_not_modified(etag, last_modified):
+    """Check the request's conditional headers against the current FAQ version."""
+    if not etag:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+def with_cache_headers(response, etag, last_modified):
+    """Add validators and Cache-Control to a FAQ response."""
+    if etag:
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = FAQ_CACHE_MAX_AGE
+    return response
+
+def fetch_active_faqs():
+    """Get active FAQ entries, or None if the database is unavailable."""
+    db = get_db()
+    if not db:
+        return None
+
+    try:
+        faqs = db.query(FAQ).filter(FAQ.is_active == True).all()
+        db.close()
+        return faqs
+    except Exception as e:
+        logger.error(f"Error fetching FAQ: {e}")
+        if db:
+            db.close()
+        return None
+
+def render_page_snapshot(template, faqs):
+    """Render the FAQ page once into bytes for every supported content encoding."""
+    html = template.render(faqs=faqs).encode('utf-8')
+    bodies = {'identity': html, 'gzip': gzip.compress(html, compresslevel=9)}
+    if brotli:
+        bodies['br'] = brotli.compress(html, quality=11)
+    return bodies
+
+def parse_api_args(args):
+    """
+    Parse ?after=&limit=&fields= for /api/faq.
+    Returns (after, limit, fields) or raises ValueError with a message for the client.
+    """
+    try:
+        after = int(args.get('after', 0))
+        limit = int(args.get('limit', API_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("'after' and 'limit' must be integers")
+    if after < 0 or not 1 <= limit <= API_MAX_LIMIT:
+        raise ValueError(f"'after' must be >= 0 and 'limit' between 1 and {API_MAX_LIMIT}")
+
+    fields = [f.strip() for f in args.get('fields', ','.join(API_FIELDS)).split(',') if f.strip()]
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if not fields or unknown:
+        raise ValueError(f"'fields' must be a subset of: {', '.join(API_FIELDS)}")
+    return after, limit, fields
+
+def fetch_api_page(after, limit, fields):
+    """
+    Get one page of active FAQ entries with id > after, selecting only the requested columns.
+    Returns (rows, next_after) or None if the database is unavailable.
+    """
+    db = get_db()
+    if not db:
+        return None
+
+    try:
+        columns = [FAQ.id] + [API_FIELDS[f] for f in fields if f != 'id']
+        # One extra row tells us whether there is a next page
+        rows = db.query(*columns).filter(FAQ.is_active == True, FAQ.id > after) \
+            .order_by(FAQ.id).limit(limit + 1).all()
+        db.close()
+    except Exception as e:
+        logger.error(f"Error in FAQ API: {e}")
+        if db:
+            db.close()
+        return None
+
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_after
+
+def stream_api_page(rows, fields, next_after):
+    """Serialize a page of FAQ rows to JSON one item at a time."""
+    yield '{"faqs":['
+    for i, row in enumerate(rows):
+        item = {f: getattr(row, f) for f in fields}
+        yield (',' if i else '') + json.dumps(item, ensure_ascii=False)
+    yield '],"next_after":' + json.dumps(next_after) + '}'
+
+def gzip_stream(chunks):
+    """Gzip-compress a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def create_faq_app(metrics=True):
+    """
+    Create Flask app for FAQ website.
+    metrics=False leaves out /metrics, for gunicorn workers that have no bot metrics.
+    The site is public, so /metrics is only served there when METRICS_TOKEN is set.
+    """
     app = Flask(__name__)
 
+    # Compiled once; the page itself is rendered only when the FAQ changes
+    page_template = app.jinja_env.from_string(FAQ_TEMPLATE)
+    page_snapshot = {'etag': None, 'bodies': None}
+    snapshot_lock = threading.Lock()
+
+    def get_page_snapshot(etag):
+        with snapshot_lock:
+            if page_snapshot['etag'] != etag:
+                faqs = fetch_active_faqs()
+                if faqs is None:
+                    return None
+                page_snapshot['bodies'] = render_page_snapshot(page_template, faqs)
+                page_snapshot['etag'] = etag
+                logger.info("FAQ page snapshot rendered")
+            return page_snapshot['bodies']
+
     @app.route('/')
     def faq_page():
         """Main FAQ page."""
-        db = get_db()
-        if not db:
-            faqs = []
-        else:
-            try:
-                faqs = db.query(FAQ).filter(FAQ.is_active == True).all()
-                db.close()
-            except Exception as e:
-                logger.error(f"Error fetching FAQ: {e}")
-                faqs = []
-                if db:
-                    db.close()
-
-        return render_template_string(FAQ_TEMPLATE, faqs=faqs)
+        etag, last_modified = get_faq_version()
+        encoding = request.accept_encodings.best_match(PAGE_ENCODINGS, default='identity')
+        # Each encoding is a separate representation with its own validator
+        variant_etag = f"{etag}-{encoding}" if etag else None
+        if is_not_modified(variant_etag, last_modified):
+            response = with_cache_headers(Response(status=304), variant_etag, last_modified)
+            response.vary.add('Accept-Encoding')
+            return response
+
+        bodies = get_page_snapshot(etag) if etag else None
+        if bodies is None:
+            # Database unavailable: render an empty page and never let caches keep it
+            return Response(render_page_snapshot(page_template, [])['identity'], mimetype='text/html')
+
+        response = Response(bodies[encoding], mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return with_cache_headers(response, variant_etag, last_modified)
 
     @app.route('/health')
     def health_check():
         """Health check endpoint."""
         return {'status': 'ok', 'service': 'speakyz-faq'}, 200
 
+    if metrics and METRICS_TOKEN:
+        @app.route('/metrics')
+        def metrics_page():
+            """Prometheus metrics of this process."""
+            if not authorized(request.headers.get('Authorization')):
+                return Response(status=401)
+            return Response(registry.render(), content_type=CONTENT_TYPE)
+
     @app.route('/api/faq')
     def api_faq():
-        """API endpoint for FAQ data."""
-        db = get_db()
-        if not db:
+        """
+        API endpoint for FAQ data.
+        Supports ?after=<id>&limit=<n> cursor paging and ?fields=id,question field selection.
+        """
+        try:
+            after, limit, fields = parse_api_args(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        etag, last_modified = get_faq_version()
+        encoding = request.accept_encodings.best_match(['gzip', 'identity'], default='identity')
+        # Each page, field set and encoding is a separate representation
+        variant_etag = None
+        if etag:
+            variant_etag = f"{etag}-{zlib.crc32(request.query_string):08x}-{encoding}"
+        if is_not_modified(variant_etag, last_modified):
+            response = with_cache_headers(Response(status=304), variant_etag, last_modified)
+            response.vary.add('Accept-Encoding')
+            return response
+
+        page = fetch_api_page(after, limit, fields)
+        if page is None:
             return {'error': 'Database not available'}, 500
 
-        try:
-            faqs = db.query(FAQ).filter(FAQ.is_active == True).all()
-            faq_list = []
-            for faq in faqs:
-                faq_list.append({
-                    'id': faq.id,
-                    'question': faq.question,
-                    'answer': faq.answer
-                })
-            db.close()
-            return {'faqs': faq_list}
-        except Exception as e:
-            logger.error(f"Error in FAQ API: {e}")
-            if db:
-                db.close()
-            return {'error': 'Internal server error'}, 500
+        rows, next_after = page
+        body = stream_api_page(rows, fields, next_after)
+        if encoding == 'gzip':
+            body = gzip_stream(body)
+        response = Response(body, mimetype='application/json')
+        if encoding == 'gzip':
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return with_cache_headers(response, variant_etag, last_modified)
 
     return app
 
 def start_faq_site():
     """Start FAQ site in a separate thread."""
     import os
+    from config import BOT_MODE, FAQ_SERVER_MODE
+    # In webhook mode the FAQ site is served by the webhook server
+    if BOT_MODE == 'webhook':
+        logger.info("FAQ site is served by the webhook server")
+        return
+
+    # In production mode main.py runs the FAQ site in a separate process
+    if FAQ_SERVER_MODE == 'production':
+        logger.info("FAQ site is served by the production FAQ server")
+        return
+
     # Skip FAQ site on Render (single service deployment)
     if os.getenv('RENDER'):
         logger.info("Skipping FAQ site on Render deployment")
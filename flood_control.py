@@ -0,0 +1,87 @@
+"""
+Flood control for SPEAKYZ bot.
+Runs before every handler and drops updates from users (or all users together)
+that exceed their rate, replying with at most one "please wait" notice per interval.
+"""
+
+import logging
+import time
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from rate_limit import TokenBucket, KeyedTokenBuckets
+from admin import is_admin
+from cache import TTLCache
+from metrics import registry
+from config import (FLOOD_USER_RATE, FLOOD_USER_BURST, FLOOD_GLOBAL_RATE, FLOOD_GLOBAL_BURST,
+                    FLOOD_WARN_INTERVAL, FLOOD_MAX_USERS)
+
+logger = logging.getLogger(__name__)
+
+# Handler group that runs before the default group 0
+FLOOD_CONTROL_GROUP = -1
+# How often buckets that refilled completely are dropped
+PRUNE_INTERVAL = 60  # seconds
+
+user_buckets = KeyedTokenBuckets(FLOOD_USER_RATE, FLOOD_USER_BURST, max_keys=FLOOD_MAX_USERS)
+global_bucket = TokenBucket(FLOOD_GLOBAL_RATE, FLOOD_GLOBAL_BURST)
+# Users who already got a notice; entries expire after FLOOD_WARN_INTERVAL
+_warned = TTLCache(FLOOD_MAX_USERS, FLOOD_WARN_INTERVAL)
+_last_prune = time.monotonic()
+
+flood_stats = {'allowed': 0, 'dropped_user': 0, 'dropped_global': 0, 'warned': 0}
+registry.callback('bot_flood_updates_total', 'Updates seen by flood control by outcome.',
+                  lambda: flood_stats, type='counter', labelname='outcome')
+
+
+def _prune():
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune >= PRUNE_INTERVAL:
+        _last_prune = now
+        user_buckets.prune()
+
+
+async def _warn(update: Update, user_id):
+    """Tell the user to slow down at most once per interval; always answer dropped callback queries."""
+    warn = not _warned.get(user_id)
+    if warn:
+        _warned.set(user_id, True)
+        flood_stats['warned'] += 1
+
+    text = "⏳ Слишком много запросов. Подождите несколько секунд."
+    try:
+        if update.callback_query:
+            # Unanswered queries leave the button spinning until Telegram times out
+            await update.callback_query.answer(text if warn else None)
+        elif warn and update.effective_message and update.effective_chat and update.effective_chat.type == 'private':
+            await update.effective_message.reply_text(text)
+    except Exception as e:
+        logger.debug(f"Could not send flood notice to {user_id}: {e}")
+
+
+async def flood_control(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Drop updates over the per-user or global rate.
+    Per-user limits are checked first, so a flooding user does not use up the global budget.
+    """
+    user = update.effective_user
+    # Inline queries are superseded by the next keystroke anyway; dropping the last one leaves stale results
+    if user is None or update.inline_query:
+        return
+
+    _prune()
+    if is_admin(user):
+        return
+
+    if not user_buckets.get(user.id).try_acquire():
+        flood_stats['dropped_user'] += 1
+        await _warn(update, user.id)
+        raise ApplicationHandlerStop
+
+    if not global_bucket.try_acquire():
+        flood_stats['dropped_global'] += 1
+        logger.warning(f"Global update rate exceeded, dropping update from user {user.id}")
+        await _warn(update, user.id)
+        raise ApplicationHandlerStop
+
+    flood_stats['allowed'] += 1
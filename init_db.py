@@ -1,24 +1,55 @@
-
 #!/usr/bin/env python3
 """
 Database initialization script for SPEAKYZ bot.
 Run this once to set up the database schema.
+
+Usage:
+    python init_db.py           # create tables, apply migrations, add default FAQ
+    python init_db.py upgrade   # apply pending migrations only
+    python init_db.py status    # show current schema version and pending migrations
 """
 
+import sys
 import logging
-from models import init_db, init_default_faq
+from models import init_db, init_default_faq, engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def require_database():
+    """Exit with an error when DATABASE_URL is not configured."""
+    if engine is None:
+        logger.error("DATABASE_URL is not set, cannot reach the database")
+        sys.exit(1)
+
+def upgrade():
+    """Apply pending schema migrations."""
+    require_database()
+    from migrations import upgrade as apply_migrations
+    count = apply_migrations()
+    logger.info(f"Database is up to date ({count} migration(s) applied)")
+
+def status():
+    """Show schema version and pending migrations."""
+    require_database()
+    from migrations import current_version, pending_migrations
+    logger.info(f"Current schema version: {current_version()}")
+    pending = pending_migrations()
+    if not pending:
+        logger.info("No pending migrations")
+    for version, name in pending:
+        logger.info(f"Pending migration {version}: {name}")
+
 def main():
     """Initialize database with tables and default data."""
     try:
         logger.info("Starting database initialization...")
         
-        # Create tables
-        init_db()
-        logger.info("Database tables created successfully")
+        # Create tables and apply migrations
+        if not init_db():
+            logger.error("Database tables or migrations were not applied")
+        else:
+            logger.info("Database tables created successfully")
         
         # Add default FAQ
         init_default_faq()
@@ -31,4 +62,10 @@ def main():
         raise
 
 if __name__ == '__main__':
-    main()
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'upgrade':
+        upgrade()
+    elif command == 'status':
+        status()
+    else:
+        main()
@@ -13,6 +13,8 @@ from bot import start_bot
 from faq_site import create_faq_app
 from console_admin import start_console_admin
 from models import init_db, init_default_faq
+from config import BOT_MODE, FAQ_SERVER_MODE
+from faq_server import start_faq_server, stop_faq_server
 
 # Configure logging
 logging.basicConfig(
@@ -58,8 +60,17 @@ def main():
         except Exception as e:
             logger.warning(f"Console admin failed to start: {e}")
         
+        # In webhook mode the bot serves the FAQ site on the same port
+        if BOT_MODE == 'webhook':
+            logger.info("FAQ site will be served by the webhook server")
+        # Production: multi-worker FAQ server in its own process
+        elif FAQ_SERVER_MODE == 'production':
+            try:
+                start_faq_server()
+            except Exception as e:
+                logger.warning(f"FAQ server failed to start: {e}")
         # Skip Flask site for Render deployment (single service only)
-        if not os.getenv('RENDER'):
+        elif not os.getenv('RENDER'):
             try:
                 flask_thread = threading.Thread(target=run_flask_app, daemon=True)
                 flask_thread.start()
@@ -78,6 +89,8 @@ def main():
     except Exception as e:
         logger.error(f"Error starting application: {e}")
         raise
+    finally:
+        stop_faq_server()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,97 @@
+"""
+Media registry for SPEAKYZ bot.
+Uploads each asset to Telegram once and then sends it by file_id.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from telegram.error import BadRequest
+import repository
+
+logger = logging.getLogger(__name__)
+
+
+class MediaRegistry:
+    """Maps local files to Telegram file_ids, keyed by content hash."""
+
+    def __init__(self):
+        self._hashes = {}  # path -> (mtime, size, content hash)
+        self._file_ids = {}  # content hash -> file_id
+        self._locks = {}  # content hash -> upload lock
+
+    def _content_hash(self, path):
+        """Hash file contents, re-reading only when the file changes on disk."""
+        stat = os.stat(path)  # raises FileNotFoundError for missing assets
+        cached = self._hashes.get(path)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        self._hashes[path] = (stat.st_mtime, stat.st_size, content_hash)
+        return content_hash
+
+    async def _lookup(self, content_hash):
+        file_id = self._file_ids.get(content_hash)
+        if file_id:
+            return file_id
+        try:
+            file_id = await repository.get_media_file_id(content_hash)
+        except Exception as e:
+            logger.warning(f"Could not load media file_id: {e}")
+            return None
+        if file_id:
+            self._file_ids[content_hash] = file_id
+        return file_id
+
+    async def _forget(self, content_hash):
+        self._file_ids.pop(content_hash, None)
+        try:
+            await repository.delete_media_file_id(content_hash)
+        except Exception as e:
+            logger.warning(f"Could not delete media file_id: {e}")
+
+    async def _remember(self, content_hash, file_id, path):
+        self._file_ids[content_hash] = file_id
+        try:
+            await repository.save_media_file_id(content_hash, file_id, path)
+        except Exception as e:
+            logger.warning(f"Could not save media file_id: {e}")
+
+    async def send_photo(self, bot, chat_id, path, **kwargs):
+        """
+        Send a photo by cached file_id, uploading it only the first time.
+        Raises FileNotFoundError if the asset is missing.
+        """
+        content_hash = self._content_hash(path)
+
+        file_id = await self._lookup(content_hash)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+            except BadRequest as e:
+                if 'file' not in str(e).lower():
+                    raise
+                logger.warning(f"Telegram rejected cached file_id for {path}: {e}")
+                await self._forget(content_hash)
+
+        # Only one upload per asset; concurrent senders reuse its file_id
+        lock = self._locks.setdefault(content_hash, asyncio.Lock())
+        async with lock:
+            file_id = self._file_ids.get(content_hash)
+            if file_id:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+
+            with open(path, 'rb') as photo:
+                message = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+            await self._remember(content_hash, message.photo[-1].file_id, path)
+            logger.info(f"Uploaded {path} to Telegram and cached its file_id")
+            return message
+
+
+media_registry = MediaRegistry()
@@ -0,0 +1,295 @@
+"""
+Metrics for SPEAKYZ bot.
+A small in-process registry rendered in the Prometheus text exposition format,
+plus the hooks that feed it: handler timing, DB statement timing and Telegram API calls.
+"""
+
+import contextlib
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event
+from telegram.ext import ApplicationHandlerStop
+from telegram.request import HTTPXRequest
+from query_profiler import profile_handler
+from config import METRICS_HOST, METRICS_TOKEN
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Name of the repository function running on the current thread, used to label DB statements
+db_call_site = contextvars.ContextVar('db_call_site', default='other')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.labelnames, key), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative histogram with optional labels."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                    result.append((f"{self.name}_bucket", labels, cumulative))
+                labels = _format_labels(self.labelnames, key)
+                result.append((f"{self.name}_sum", labels, total))
+                result.append((f"{self.name}_count", labels, count))
+        return result
+
+
+class CallbackMetric:
+    """Value read at scrape time. func returns a number or a {label value: number} dict."""
+
+    def __init__(self, name, documentation, func, type='gauge', labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.type = type
+        self.labelname = labelname
+
+    def samples(self):
+        value = self.func()
+        if self.labelname is None:
+            return [(self.name, "", value)]
+        return [(self.name, _format_labels((self.labelname,), (label,)), v)
+                for label, v in sorted(value.items())]
+
+
+class Registry:
+    """All metrics of this process."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, func, type='gauge', labelname=None):
+        return self.register(CallbackMetric(name, documentation, func, type, labelname))
+
+    def render(self):
+        """Render all metrics in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.warning(f"Could not collect metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_seconds = registry.histogram(
+    'bot_handler_seconds', 'Time spent in update handlers.', ['handler'])
+handler_errors = registry.counter(
+    'bot_handler_errors_total', 'Exceptions raised by update handlers.', ['handler'])
+db_query_seconds = registry.histogram(
+    'db_query_seconds', 'SQL statement execution time by repository call site.', ['site'])
+db_call_seconds = registry.histogram(
+    'db_call_seconds', 'Repository function time including session setup and commit.', ['site'])
+telegram_api_seconds = registry.histogram(
+    'telegram_api_seconds', 'Telegram Bot API request time by method.', ['method'])
+telegram_retry_after = registry.counter(
+    'telegram_api_retry_after_total', 'Telegram Bot API responses asking to retry later (HTTP 429).', ['method'])
+
+
+@contextlib.contextmanager
+def track_handler(name):
+    """Time a handler and count its exceptions. ApplicationHandlerStop is not an error."""
+    started = time.perf_counter()
+    try:
+        with profile_handler(name):
+            yield
+    except ApplicationHandlerStop:
+        raise
+    except Exception:
+        handler_errors.inc(handler=name)
+        raise
+    finally:
+        handler_seconds.observe(time.perf_counter() - started, handler=name)
+
+
+def _timed_callback(callback):
+    name = getattr(callback, '__name__', repr(callback))
+
+    async def timed(update, context):
+        with track_handler(name):
+            return await callback(update, context)
+
+    timed.__name__ = name
+    return timed
+
+
+def instrument_handlers(application):
+    """Wrap the callbacks of all registered handlers with timing and error counting."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = _timed_callback(handler.callback)
+
+
+def instrument_engine(engine):
+    """Time every SQL statement and export connection pool gauges."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        db_query_seconds.observe(time.perf_counter() - started, site=db_call_site.get())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        stack = exception_context.connection.info.get('query_started') if exception_context.connection else None
+        if stack:
+            stack.pop()
+
+    pool = engine.pool
+    registry.callback('db_pool_size', 'Configured connection pool size.', pool.size)
+    registry.callback('db_pool_checked_out', 'Connections currently in use.', pool.checkedout)
+    registry.callback('db_pool_checked_in', 'Idle connections in the pool.', pool.checkedin)
+    # QueuePool reports a negative overflow while the pool is not full
+    registry.callback('db_pool_overflow', 'Connections opened beyond the pool size.',
+                      lambda: max(0, pool.overflow()))
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records Bot API latency and 429 responses per API method."""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        finally:
+            telegram_api_seconds.observe(time.perf_counter() - started, method=api_method)
+        if code == 429:
+            telegram_retry_after.inc(method=api_method)
+        return code, payload
+
+
+def authorized(authorization):
+    """Check an Authorization header against METRICS_TOKEN (always allowed without a token)."""
+    if not METRICS_TOKEN:
+        return True
+    # compare_digest only accepts ASCII str, and headers may carry any characters
+    return hmac.compare_digest((authorization or '').encode('utf-8'), f"Bearer {METRICS_TOKEN}".encode('utf-8'))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        if not authorized(self.headers.get('Authorization')):
+            self.send_error(401)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host=METRICS_HOST):
+    """Serve /metrics from a background thread, for processes without the FAQ site."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics server listening on {host}:{port}")
+    return server
@@ -0,0 +1,121 @@
+"""
+Versioned schema migrations for SPEAKYZ bot.
+Each migration runs once; applied versions are recorded in the schema_version table.
+"""
+
+import logging
+from sqlalchemy import text, select, inspect
+from models import SchemaVersion, engine
+
+logger = logging.getLogger(__name__)
+
+# Serializes migrations when several instances start at once (PostgreSQL only)
+MIGRATION_LOCK_ID = 5717320
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a forward migration. The function receives an open connection."""
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+@migration(1, "user lookup indexes")
+def _user_lookup_indexes(conn):
+    # Usernames are matched case-insensitively by admin commands
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_username_lower ON users (lower(username))"
+    ))
+    # Only subscribed users are counted, so keep the index partial
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_subscription_type ON users (subscription_type) "
+        "WHERE subscription_type IS NOT NULL"
+    ))
+
+
+@migration(2, "faq and payment indexes")
+def _faq_payment_indexes(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_faq_is_active_id ON faq (is_active, id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_payments_telegram_id ON payments (telegram_id)"))
+
+
+@migration(3, "subscription expiry index")
+def _subscription_expiry_index(conn):
+    # Range scans for expired subscriptions only look at users that have an end date
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_subscription_end ON users (subscription_end) "
+        "WHERE subscription_end IS NOT NULL"
+    ))
+
+
+def _add_column(conn, table, column, ddl):
+    # SQLite has no ADD COLUMN IF NOT EXISTS, so check the live schema first
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+@migration(4, "payment verification")
+def _payment_verification(conn):
+    _add_column(conn, 'payments', 'receipt_file_id', 'VARCHAR(255)')
+    _add_column(conn, 'payments', 'verified_at', 'TIMESTAMP')
+    _add_column(conn, 'payments', 'verified_by', 'BIGINT')
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_payments_unverified ON payments (id) "
+        "WHERE is_verified = false"
+    ))
+
+
+@migration(5, "faq updated_at")
+def _faq_updated_at(conn):
+    # The FAQ site derives its ETag and Last-Modified from this column
+    _add_column(conn, 'faq', 'updated_at', 'TIMESTAMP')
+    conn.execute(text("UPDATE faq SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+def applied_versions(conn):
+    """Get the set of applied migration versions."""
+    return set(conn.execute(select(SchemaVersion.version)).scalars())
+
+
+def current_version():
+    """Get the highest applied migration version (0 if none)."""
+    with engine.connect() as conn:
+        SchemaVersion.__table__.create(conn, checkfirst=True)
+        return max(applied_versions(conn), default=0)
+
+
+def pending_migrations():
+    """Get (version, name) of migrations not applied yet."""
+    with engine.connect() as conn:
+        SchemaVersion.__table__.create(conn, checkfirst=True)
+        applied = applied_versions(conn)
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def upgrade():
+    """Apply all pending migrations in one transaction. Returns the number applied."""
+    if not engine:
+        raise RuntimeError("Database not configured")
+
+    count = 0
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+        SchemaVersion.__table__.create(conn, checkfirst=True)
+
+        applied = applied_versions(conn)
+        for version, name, func in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info(f"Applying migration {version}: {name}")
+            func(conn)
+            conn.execute(SchemaVersion.__table__.insert().values(version=version, name=name))
+            count += 1
+
+    if count:
+        logger.info(f"Applied {count} migration(s)")
+    return count
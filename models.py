@@ -3,10 +3,14 @@ Database models for SPEAKYZ bot system.
 """
 
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, DateTime, Boolean, Text, Float
+from sqlalchemy import (create_engine, Column, Integer, BigInteger, String, DateTime, Boolean, Text, Float,
+                        Index, func)
 from datetime import datetime
 import os
 import logging
+from metrics import instrument_engine
+from query_profiler import install_profiler
+from config import DB_PROFILE
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +31,17 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Existing databases get these through migrations.py
+    __table_args__ = (
+        Index('ix_users_username_lower', func.lower(username)),
+        Index('ix_users_subscription_type', subscription_type,
+              postgresql_where=subscription_type.isnot(None),
+              sqlite_where=subscription_type.isnot(None)),
+        Index('ix_users_subscription_end', subscription_end,
+              postgresql_where=subscription_end.isnot(None),
+              sqlite_where=subscription_end.isnot(None)),
+    )
+
 class FAQ(Base):
     __tablename__ = 'faq'
 
@@ -35,8 +50,13 @@ class FAQ(Base):
     answer = Column(Text, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by = Column(Integer)  # telegram_id of admin who created
 
+    __table_args__ = (
+        Index('ix_faq_is_active_id', is_active, id),
+    )
+
 class Payment(Base):
     __tablename__ = 'payments'
 
@@ -47,6 +67,47 @@ class Payment(Base):
     subscription_type = Column(String(50), nullable=False)
     payment_date = Column(DateTime, default=datetime.utcnow)
     is_verified = Column(Boolean, default=False)
+    receipt_file_id = Column(String(255))  # Telegram file_id of the receipt photo
+    verified_at = Column(DateTime)
+    verified_by = Column(BigInteger)  # telegram_id of admin who approved
+
+    __table_args__ = (
+        Index('ix_payments_telegram_id', telegram_id),
+        # The admin queue only ever reads unverified payments
+        Index('ix_payments_unverified', id,
+              postgresql_where=is_verified == False,
+              sqlite_where=is_verified == False),
+    )
+
+class MediaFile(Base):
+    __tablename__ = 'media_files'
+
+    content_hash = Column(String(64), primary_key=True)  # sha256 of the file contents
+    file_id = Column(String(255), nullable=False)  # Telegram file_id returned on upload
+    path = Column(String(255))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    created_by = Column(BigInteger)  # telegram_id of admin, None if created from console
+    status = Column(String(20), default='pending')  # pending, running, done
+    last_user_id = Column(Integer, default=0)  # users.id checkpoint for resuming
+    sent_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    blocked_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime)  # refreshed on every checkpoint while running
+    finished_at = Column(DateTime)
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
 
 # Database connection
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -54,9 +115,13 @@ if not DATABASE_URL:
     print("⚠️  DATABASE_URL не найден в переменных окружения!")
     print("Для работы бота требуется PostgreSQL база данных")
     DATABASE_URL = None
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+
 if DATABASE_URL:
     engine = create_engine(
         DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
         pool_pre_ping=True,
         pool_recycle=300,
         pool_timeout=20,
@@ -64,6 +129,9 @@ if DATABASE_URL:
         echo=False
     )
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    instrument_engine(engine)
+    if DB_PROFILE:
+        install_profiler(engine)
 else:
     engine = None
     SessionLocal = None
@@ -93,12 +161,21 @@ def get_db():
         return None
 
 def init_db():
-    """Initialize database."""
+    """Initialize database: create missing tables and apply pending migrations."""
     if not DATABASE_URL:
         logger.error("Cannot initialize database: DATABASE_URL not set")
         return False
 
-    return create_tables()
+    if not create_tables():
+        return False
+
+    from migrations import upgrade
+    try:
+        upgrade()
+        return True
+    except Exception as e:
+        logger.error(f"Error applying migrations: {e}")
+        return False
 
 def init_default_faq():
     """Initialize default FAQ entries."""
@@ -125,7 +202,7 @@ def init_default_faq():
             },
             {
                 "question": "Как оплатить обучение?",
-                "answer": "Оплата производится переводом на карту. После оплаты ваша подписка активируется автоматически."
+                "answer": "Оплата производится переводом на карту. Отправьте фото чека в боте (Купить подписку → Я оплатил), и подписка активируется сразу после проверки платежа."
             },
             {
                 "question": "Можно ли вернуть деньги?",
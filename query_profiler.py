@@ -0,0 +1,147 @@
+"""
+Opt-in SQL profiling for SPEAKYZ bot (DB_PROFILE=1).
+Tags statements with the handler that issued them, logs slow statements with
+their parameters and query plan, and flags handlers that run too many queries
+for one update (usually an N+1 loop).
+"""
+
+import collections
+import contextlib
+import contextvars
+import logging
+import re
+import threading
+import time
+from sqlalchemy import event
+from config import DB_PROFILE, DB_SLOW_QUERY_MS, DB_MAX_QUERIES_PER_UPDATE
+
+logger = logging.getLogger(__name__)
+
+# Parameters and statements are cut to this many characters in log lines
+MAX_LOG_LENGTH = 500
+# Characters kept in the handler tag appended to statements as an SQL comment
+_UNSAFE_COMMENT = re.compile(r'[^\w:.-]')
+
+_scope = contextvars.ContextVar('query_scope', default=None)
+
+
+class QueryScope:
+    """Statements issued by one handler invocation."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.count = 0
+        self.statements = collections.Counter()
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def record(self, statement):
+        with self._lock:
+            self.count += 1
+            self.statements[statement] += 1
+
+
+def _shorten(value):
+    text = str(value)
+    return text if len(text) <= MAX_LOG_LENGTH else text[:MAX_LOG_LENGTH] + "..."
+
+
+def _current_scope():
+    scope = _scope.get()
+    # Work started by a handler (e.g. a task) may outlive it
+    return scope if scope is not None and not scope.closed else None
+
+
+@contextlib.contextmanager
+def profile_handler(name):
+    """Count the statements run by the with-block and warn when there are too many."""
+    if not DB_PROFILE:
+        yield
+        return
+
+    scope = QueryScope(name)
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+        scope.closed = True
+        if scope.count > DB_MAX_QUERIES_PER_UPDATE:
+            statement, repeats = scope.statements.most_common(1)[0]
+            logger.warning(
+                f"Handler {name} ran {scope.count} queries for one update "
+                f"(limit {DB_MAX_QUERIES_PER_UPDATE}); most repeated {repeats}x: {_shorten(statement)}"
+            )
+
+
+def _explain(conn, statement, parameters):
+    """
+    Query plan of a statement, run on a separate cursor so the original result is untouched.
+    On PostgreSQL it runs inside a savepoint: a failed EXPLAIN would otherwise abort
+    the handler's open transaction.
+    """
+    if conn.dialect.name == 'sqlite':
+        prefix, savepoint = "EXPLAIN QUERY PLAN ", False
+    else:
+        prefix, savepoint = "EXPLAIN ", True
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT query_profiler_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT query_profiler_explain")
+            raise
+        finally:
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT query_profiler_explain")
+        return plan
+    finally:
+        cursor.close()
+
+
+def install_profiler(engine):
+    """Attach the profiling hooks to an engine."""
+    # metrics imports this module for profile_handler
+    from metrics import db_call_site
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+        scope = _current_scope()
+        if scope is not None:
+            # Shows up in pg_stat_statements and server logs
+            statement = f"{statement} /* handler={_UNSAFE_COMMENT.sub('', scope.handler)} */"
+        return statement, parameters
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info['profile_started'].pop()) * 1000
+        scope = _current_scope()
+        if scope is not None:
+            scope.record(statement)
+
+        if elapsed_ms < DB_SLOW_QUERY_MS:
+            return
+        handler = scope.handler if scope is not None else "-"
+        message = (f"Slow query {elapsed_ms:.0f} ms (handler {handler}, site {db_call_site.get()}): "
+                   f"{_shorten(statement)} params={_shorten(parameters)}")
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            try:
+                message += "\n" + _explain(conn, statement, parameters)
+            except Exception as e:
+                message += f"\n(no plan: {e})"
+        logger.warning(message)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        stack = connection.info.get('profile_started') if connection is not None else None
+        if stack:
+            stack.pop()
+
+    logger.info(f"SQL profiling enabled: slow query {DB_SLOW_QUERY_MS} ms, "
+                f"{DB_MAX_QUERIES_PER_UPDATE} queries per update")
@@ -0,0 +1,85 @@
+"""
+Token bucket rate limiting for SPEAKYZ bot.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Allows `rate` operations per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available right now."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens=1):
+        """Seconds until `tokens` will be available."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens=1):
+        """Wait until tokens are available and take them."""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+    def pause(self, seconds):
+        """Refuse all tokens for the given time, e.g. after a RetryAfter from Telegram."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def is_idle(self):
+        """True when the bucket is full again, i.e. indistinguishable from a new one."""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and time.monotonic() >= self.paused_until
+
+
+class KeyedTokenBuckets:
+    """One token bucket per key (chat, user) with a bounded number of keys."""
+
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get(self, key):
+        """Get the bucket for key, creating it if needed."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            # Least recently used buckets go first; they have mostly refilled anyway
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def prune(self):
+        """Drop buckets that are full again."""
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_idle()]:
+            del self._buckets[key]
@@ -0,0 +1,622 @@
+"""
+Async data-access layer for SPEAKYZ bot.
+Runs blocking SQLAlchemy work in a bounded thread pool so bot handlers
+never block the event loop while waiting on the database.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update, or_, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from models import User, FAQ, Payment, MediaFile, Broadcast, get_db, engine, DB_POOL_SIZE
+from cache import profile_cache, faq_version
+from stats import admin_stats, compute_stats
+from faq_index import faq_index
+from metrics import db_call_site, db_call_seconds
+
+logger = logging.getLogger(__name__)
+
+# Length of one paid subscription period
+SUBSCRIPTION_PERIOD = timedelta(days=30)
+
+# One worker per pooled connection, so a worker never waits on pool checkout
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when the database is not configured or cannot be reached."""
+
+
+def _run_in_session(func, args):
+    """Run func(db, *args) inside a fresh session and always close it."""
+    db = get_db()
+    if not db:
+        raise DatabaseUnavailable("Database not available")
+    site = func.__name__.lstrip('_')
+    token = db_call_site.set(site)
+    try:
+        with db_call_seconds.time(site=site):
+            return func(db, *args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        db_call_site.reset(token)
+
+
+async def run_db(func, *args):
+    """Run a blocking session function in the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor, functools.partial(ctx.run, _run_in_session, func, args)
+    )
+
+
+def shutdown():
+    """Stop the DB executor, waiting for queued work to finish."""
+    _executor.shutdown(wait=True)
+
+
+# Users
+
+def _upsert_user(db, telegram_id, username, first_name, last_name):
+    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    if not user:
+        user = User(
+            telegram_id=telegram_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name
+        )
+        db.add(user)
+        created = True
+    else:
+        user.username = username
+        user.first_name = first_name
+        user.last_name = last_name
+        user.is_active = True
+        user.updated_at = datetime.utcnow()
+        created = False
+    db.commit()
+    return created
+
+
+async def upsert_user(telegram_id, username, first_name, last_name):
+    """Create or update a user by telegram_id."""
+    if await run_db(_upsert_user, telegram_id, username, first_name, last_name):
+        admin_stats.add_users(1)
+    profile_cache.invalidate(telegram_id)
+
+
+_UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def _bulk_upsert_users(db, rows):
+    insert = _UPSERT_DIALECTS.get(engine.dialect.name)
+    if insert is None:
+        # No ON CONFLICT support: fall back to one upsert per row
+        created = sum(
+            _upsert_user(db, row['telegram_id'], row['username'], row['first_name'], row['last_name'])
+            for row in rows
+        )
+        return created, [row['telegram_id'] for row in rows]
+
+    now = datetime.utcnow()
+    values = [
+        dict(row, created_at=now, updated_at=now, is_active=True, speaking_clubs_count=0)
+        for row in rows
+    ]
+    stmt = insert(User).values(values)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            'username': excluded.username,
+            'first_name': excluded.first_name,
+            'last_name': excluded.last_name,
+            'is_active': True,
+            'updated_at': excluded.updated_at,
+        },
+        # Leave rows whose profile did not actually change untouched;
+        # a user who had blocked the bot is writing to it again, so reactivate them
+        where=(
+            User.username.is_distinct_from(excluded.username)
+            | User.first_name.is_distinct_from(excluded.first_name)
+            | User.last_name.is_distinct_from(excluded.last_name)
+            | User.is_active.is_(False)
+        )
+    ).returning(User.telegram_id, User.created_at)
+    # Only inserted and actually changed rows are returned; updated rows keep their
+    # old created_at, so only inserted rows carry this batch's timestamp
+    written = db.execute(stmt).all()
+    db.commit()
+    created = sum(1 for _, created_at in written if created_at == now)
+    return created, [telegram_id for telegram_id, _ in written]
+
+
+async def bulk_upsert_users(rows):
+    """Upsert many users in one INSERT ... ON CONFLICT (telegram_id) DO UPDATE."""
+    created, changed_ids = await run_db(_bulk_upsert_users, rows)
+    admin_stats.add_users(created)
+    for telegram_id in changed_ids:
+        profile_cache.invalidate(telegram_id)
+
+
+def _get_user(db, telegram_id):
+    return db.query(User).filter(User.telegram_id == telegram_id).first()
+
+
+async def get_user(telegram_id):
+    """Get a detached User by telegram_id, or None. Served from the profile cache when possible."""
+    user = profile_cache.get(telegram_id)
+    if user is None:
+        user = await run_db(_get_user, telegram_id)
+        if user is not None:
+            profile_cache.set(telegram_id, user)
+    return user
+
+
+def _set_user_active(db, telegram_id, is_active):
+    updated = db.query(User).filter(User.telegram_id == telegram_id, User.is_active.isnot(is_active)) \
+        .update({'is_active': is_active, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return updated
+
+
+async def set_user_active(telegram_id, is_active):
+    """Mark a user as active or inactive (blocked the bot)."""
+    if await run_db(_set_user_active, telegram_id, is_active):
+        profile_cache.invalidate(telegram_id)
+
+
+def _remove_subscription(db, username):
+    # Telegram usernames are case-insensitive; matches ix_users_username_lower
+    user = db.query(User).filter(func.lower(User.username) == username.lower()).first()
+    if not user:
+        return None
+    old_type = user.subscription_type
+    user.subscription_type = None
+    user.subscription_end = None
+    user.speaking_clubs_count = 0
+    telegram_id = user.telegram_id
+    db.commit()
+    admin_stats.change_subscription(old_type, None)
+    return telegram_id
+
+
+async def remove_subscription(username):
+    """Clear a user's subscription. Returns the user's telegram_id, or None if not found."""
+    telegram_id = await run_db(_remove_subscription, username)
+    if telegram_id is not None:
+        profile_cache.invalidate(telegram_id)
+    return telegram_id
+
+
+def _expire_subscriptions_batch(db, now, batch_size):
+    # Rows locked by another instance are skipped rather than waited on
+    expired_ids = (
+        select(User.id)
+        .where(User.subscription_end.isnot(None), User.subscription_end < now)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(User)
+        .where(User.id.in_(expired_ids))
+        .values(subscription_type=None, subscription_end=None, speaking_clubs_count=0, updated_at=now)
+        .returning(User.telegram_id)
+        .execution_options(synchronize_session=False)
+    )
+    telegram_ids = list(db.execute(stmt).scalars())
+    db.commit()
+    return telegram_ids
+
+
+async def expire_subscriptions(batch_size=500):
+    """
+    Clear subscriptions whose end date has passed, in batches of set-based UPDATEs.
+    Returns the number of expired subscriptions.
+    """
+    now = datetime.utcnow()
+    total = 0
+    while True:
+        telegram_ids = await run_db(_expire_subscriptions_batch, now, batch_size)
+        for telegram_id in telegram_ids:
+            profile_cache.invalidate(telegram_id)
+        total += len(telegram_ids)
+        if len(telegram_ids) < batch_size:
+            break
+    # RETURNING only yields the cleared values, so per-plan counts need a full refresh
+    if total:
+        admin_stats.invalidate()
+    return total
+
+
+USER_LIST_COLUMNS = (User.id, User.telegram_id, User.username, User.first_name, User.last_name,
+                     User.subscription_type, User.subscription_end)
+
+
+def user_filters(plan=None, search=None):
+    """
+    WHERE conditions for user listings.
+    plan is a subscription type or 'none' for users without one; search matches names and usernames.
+    """
+    conditions = []
+    if plan == 'none':
+        conditions.append(User.subscription_type.is_(None))
+    elif plan:
+        conditions.append(User.subscription_type == plan)
+    if search:
+        pattern = f"%{search.lstrip('@')}%"
+        conditions.append(or_(
+            User.username.ilike(pattern),
+            User.first_name.ilike(pattern),
+            User.last_name.ilike(pattern)
+        ))
+    return conditions
+
+
+def _get_users_page(db, plan, search, after_id, before_id, limit):
+    stmt = select(*USER_LIST_COLUMNS).where(*user_filters(plan, search))
+    # Keyset pagination on the primary key: cost does not grow with the page number
+    if before_id is not None:
+        stmt = stmt.where(User.id < before_id).order_by(User.id.desc())
+    else:
+        stmt = stmt.where(User.id > after_id).order_by(User.id)
+    rows = [row._asdict() for row in db.execute(stmt.limit(limit + 1))]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before_id is not None:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, after_id > 0, has_more
+
+
+async def get_users_page(plan=None, search=None, after_id=0, before_id=None, limit=10):
+    """
+    Get one page of users ordered by id, after after_id or before before_id.
+    Returns (rows as dicts, has_previous_page, has_next_page).
+    """
+    return await run_db(_get_users_page, plan, search, after_id, before_id, limit)
+
+
+def count_users(db, plan=None, search=None):
+    """Count users matching a listing filter, answering from the stats cache when possible."""
+    if not search:
+        stats = admin_stats.get()
+        if stats is not None:
+            if plan == 'none':
+                return stats['total_users'] - stats['active_subs']
+            return stats['plans'].get(plan, 0) if plan else stats['total_users']
+    return db.execute(select(func.count(User.id)).where(*user_filters(plan, search))).scalar()
+
+
+async def get_users_count(plan=None, search=None):
+    """Count users matching a listing filter."""
+    return await run_db(count_users, plan, search)
+
+
+async def get_stats():
+    """
+    Get admin dashboard statistics (see stats.compute_stats).
+    Served from the stats cache; the aggregate query runs at most once per STATS_CACHE_TTL.
+    """
+    stats = admin_stats.get()
+    if stats is None:
+        stats = await run_db(compute_stats)
+        admin_stats.set(stats)
+    return stats
+
+
+async def get_user_counts():
+    """Get (total users, active subscriptions)."""
+    stats = await get_stats()
+    return stats['total_users'], stats['active_subs']
+
+
+# Payments
+
+def _create_payment(db, telegram_id, subscription_type, amount, receipt_file_id):
+    user = db.query(User.id).filter(User.telegram_id == telegram_id).first()
+    if not user:
+        return None
+    payment = Payment(
+        user_id=user.id,
+        telegram_id=telegram_id,
+        amount=amount,
+        subscription_type=subscription_type,
+        receipt_file_id=receipt_file_id
+    )
+    db.add(payment)
+    db.commit()
+    return payment.id
+
+
+async def create_payment(telegram_id, subscription_type, amount, receipt_file_id):
+    """Record a payment claim. Returns the payment id, or None if the user is not registered."""
+    return await run_db(_create_payment, telegram_id, subscription_type, amount, receipt_file_id)
+
+
+def _get_unverified_payments(db, limit):
+    # Oldest first; served by the partial index ix_payments_unverified
+    rows = db.query(Payment.id, Payment.telegram_id, Payment.subscription_type, Payment.amount,
+                    Payment.payment_date, User.username, User.first_name) \
+        .join(User, User.id == Payment.user_id) \
+        .filter(Payment.is_verified == False) \
+        .order_by(Payment.id) \
+        .limit(limit) \
+        .all()
+    total = db.query(func.count(Payment.id)).filter(Payment.is_verified == False).scalar()
+    return [row._asdict() for row in rows], total
+
+
+async def get_unverified_payments(limit=20):
+    """Get (oldest unverified payments as dicts, total number of unverified payments)."""
+    return await run_db(_get_unverified_payments, limit)
+
+
+def _get_payment_receipt(db, payment_id):
+    return db.query(Payment.receipt_file_id).filter(Payment.id == payment_id).scalar()
+
+
+async def get_payment_receipt(payment_id):
+    """Get the receipt photo file_id of a payment, or None."""
+    return await run_db(_get_payment_receipt, payment_id)
+
+
+def _approve_payments(db, payment_filter, admin_id):
+    now = datetime.utcnow()
+    # Only rows still unverified are flipped, so approving twice activates nothing twice
+    approved = db.execute(
+        update(Payment)
+        .where(payment_filter, Payment.is_verified == False)
+        .values(is_verified=True, verified_at=now, verified_by=admin_id)
+        .returning(Payment.user_id, Payment.telegram_id, Payment.subscription_type)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not approved:
+        db.commit()
+        return []
+
+    user_ids = {row.user_id for row in approved}
+    users = {
+        user.id: user
+        for user in db.query(User.id, User.subscription_type, User.subscription_end)
+        .filter(User.id.in_(user_ids))
+        .with_for_update()
+    }
+
+    # Renewals stack: each payment adds one period after the current end date
+    changes = {}
+    for row in approved:
+        change = changes.setdefault(row.user_id, {
+            'id': row.user_id,
+            'telegram_id': row.telegram_id,
+            'subscription_end': max(users[row.user_id].subscription_end or now, now),
+        })
+        change['subscription_type'] = row.subscription_type
+        change['subscription_end'] += SUBSCRIPTION_PERIOD
+
+    db.execute(update(User), [
+        {'id': c['id'], 'subscription_type': c['subscription_type'],
+         'subscription_end': c['subscription_end'], 'updated_at': now}
+        for c in changes.values()
+    ])
+    db.commit()
+    for user_id, change in changes.items():
+        admin_stats.change_subscription(users[user_id].subscription_type, change['subscription_type'])
+    return [(c['telegram_id'], c['subscription_type'], c['subscription_end']) for c in changes.values()]
+
+
+async def approve_payments(payment_ids, admin_id):
+    """
+    Verify payments and extend the payers' subscriptions in one transaction.
+    Returns (telegram_id, subscription_type, subscription_end) for each activated user.
+    """
+    activated = await run_db(_approve_payments, Payment.id.in_(payment_ids), admin_id)
+    for telegram_id, _, _ in activated:
+        profile_cache.invalidate(telegram_id)
+    return activated
+
+
+async def approve_payments_up_to(last_payment_id, admin_id):
+    """Approve every unverified payment with id <= last_payment_id, i.e. one page of the queue."""
+    activated = await run_db(_approve_payments, Payment.id <= last_payment_id, admin_id)
+    for telegram_id, _, _ in activated:
+        profile_cache.invalidate(telegram_id)
+    return activated
+
+
+# Media
+
+def _get_media_file_id(db, content_hash):
+    media = db.query(MediaFile).filter(MediaFile.content_hash == content_hash).first()
+    return media.file_id if media else None
+
+
+async def get_media_file_id(content_hash):
+    """Get the stored Telegram file_id for a file's content hash, or None."""
+    return await run_db(_get_media_file_id, content_hash)
+
+
+def _save_media_file_id(db, content_hash, file_id, path):
+    db.merge(MediaFile(content_hash=content_hash, file_id=file_id, path=path,
+                       created_at=datetime.utcnow()))
+    db.commit()
+
+
+async def save_media_file_id(content_hash, file_id, path):
+    """Store the Telegram file_id for a file's content hash."""
+    await run_db(_save_media_file_id, content_hash, file_id, path)
+
+
+def _delete_media_file_id(db, content_hash):
+    db.query(MediaFile).filter(MediaFile.content_hash == content_hash).delete()
+    db.commit()
+
+
+async def delete_media_file_id(content_hash):
+    """Forget a stored file_id that Telegram no longer accepts."""
+    await run_db(_delete_media_file_id, content_hash)
+
+
+# Broadcasts
+
+def _create_broadcast(db, text, created_by):
+    broadcast = Broadcast(text=text, created_by=created_by, status='pending')
+    db.add(broadcast)
+    db.commit()
+    return broadcast.id
+
+
+async def create_broadcast(text, created_by):
+    """Queue a broadcast. Returns its id."""
+    return await run_db(_create_broadcast, text, created_by)
+
+
+def _claim_broadcast(db, stale_before):
+    now = datetime.utcnow()
+    claimable = or_(
+        Broadcast.status == 'pending',
+        # Running broadcasts whose owner stopped checkpointing (crash, restart)
+        and_(Broadcast.status == 'running', Broadcast.heartbeat_at < stale_before)
+    )
+    candidate = db.query(Broadcast.id).filter(claimable).order_by(Broadcast.id).first()
+    if not candidate:
+        return None
+
+    # Conditional update, so only one instance wins the claim
+    claimed = db.query(Broadcast).filter(Broadcast.id == candidate.id, claimable) \
+        .update({'status': 'running', 'heartbeat_at': now}, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        return None
+
+    broadcast = db.query(Broadcast).filter(Broadcast.id == candidate.id).first()
+    return {
+        'id': broadcast.id,
+        'text': broadcast.text,
+        'created_by': broadcast.created_by,
+        'last_user_id': broadcast.last_user_id or 0,
+        'sent': broadcast.sent_count or 0,
+        'failed': broadcast.failed_count or 0,
+        'blocked': broadcast.blocked_count or 0,
+    }
+
+
+async def claim_broadcast(stale_before):
+    """Take ownership of the next pending or abandoned broadcast, or None."""
+    return await run_db(_claim_broadcast, stale_before)
+
+
+def _save_broadcast_progress(db, broadcast_id, last_user_id, sent, failed, blocked, blocked_ids):
+    if blocked_ids:
+        db.query(User).filter(User.telegram_id.in_(blocked_ids)) \
+            .update({'is_active': False}, synchronize_session=False)
+    db.query(Broadcast).filter(Broadcast.id == broadcast_id).update({
+        'last_user_id': last_user_id,
+        'sent_count': sent,
+        'failed_count': failed,
+        'blocked_count': blocked,
+        'heartbeat_at': datetime.utcnow(),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def _get_broadcast_recipients(db, after_id, limit):
+    rows = db.execute(
+        select(User.id, User.telegram_id)
+        .where(User.is_active.isnot(False), User.id > after_id)
+        .order_by(User.id)
+        .limit(limit)
+    )
+    return [tuple(row) for row in rows]
+
+
+async def get_broadcast_recipients(after_id, limit):
+    """Next page of active recipients as (user id, telegram_id), by keyset on user id."""
+    return await run_db(_get_broadcast_recipients, after_id, limit)
+
+
+def _touch_broadcast(db, broadcast_id):
+    db.query(Broadcast).filter(Broadcast.id == broadcast_id, Broadcast.status == 'running') \
+        .update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+
+async def touch_broadcast(broadcast_id):
+    """Refresh the heartbeat of a running broadcast so no other instance reclaims it."""
+    await run_db(_touch_broadcast, broadcast_id)
+
+
+async def save_broadcast_progress(broadcast_id, last_user_id, sent, failed, blocked, blocked_ids):
+    """Checkpoint a broadcast and deactivate users who blocked the bot."""
+    await run_db(_save_broadcast_progress, broadcast_id, last_user_id, sent, failed, blocked, blocked_ids)
+
+
+def _finish_broadcast(db, broadcast_id):
+    db.query(Broadcast).filter(Broadcast.id == broadcast_id) \
+        .update({'status': 'done', 'finished_at': datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+
+async def finish_broadcast(broadcast_id):
+    """Mark a broadcast as done."""
+    await run_db(_finish_broadcast, broadcast_id)
+
+
+# FAQ
+
+def _get_active_faqs(db):
+    return db.query(FAQ).filter(FAQ.is_active == True).all()
+
+
+async def get_active_faqs():
+    """Get all active FAQ entries."""
+    return await run_db(_get_active_faqs)
+
+
+def _add_faq(db, question, answer, created_by):
+    faq = FAQ(question=question, answer=answer, created_by=created_by)
+    db.add(faq)
+    db.commit()
+    return faq.id
+
+
+async def add_faq(question, answer, created_by):
+    """Add a FAQ entry. Returns the new FAQ id."""
+    faq_id = await run_db(_add_faq, question, answer, created_by)
+    admin_stats.add_faq()
+    faq_index.add(faq_id, question, answer)
+    faq_version.bump()
+    return faq_id
+
+
+def _update_faq(db, faq_id, question, answer):
+    faq = db.query(FAQ).filter(FAQ.id == faq_id).first()
+    if not faq:
+        return False
+    faq.question = question
+    faq.answer = answer
+    db.commit()
+    return True
+
+
+async def update_faq(faq_id, question, answer):
+    """Update a FAQ entry. Returns False if it does not exist."""
+    updated = await run_db(_update_faq, faq_id, question, answer)
+    if updated:
+        faq_index.add(faq_id, question, answer)
+        faq_version.bump()
+    return updated
@@ -0,0 +1,128 @@
+"""
+Admin statistics for SPEAKYZ bot.
+Computes all dashboard numbers in one aggregate query and keeps them cached,
+adjusting the cached numbers as users, subscriptions and FAQ entries change.
+"""
+
+import copy
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from models import User, FAQ
+from config import STATS_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+def compute_stats(db, now=None):
+    """Run the aggregate stats query in an open session."""
+    now = now or datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = now - timedelta(days=7)
+
+    faq_count = select(func.count(FAQ.id)).where(FAQ.is_active == True).scalar_subquery()
+    # One row per subscription type (NULL = no subscription), at most a handful of rows
+    rows = db.execute(
+        select(
+            User.subscription_type,
+            func.count(User.id),
+            func.count(User.id).filter(User.created_at >= today),
+            func.count(User.id).filter(User.created_at >= week_ago),
+            faq_count,
+        ).group_by(User.subscription_type)
+    ).all()
+
+    stats = {
+        'total_users': 0,
+        'active_subs': 0,
+        'new_today': 0,
+        'new_week': 0,
+        'plans': {},
+        'faq_count': rows[0][4] if rows else db.execute(select(faq_count)).scalar(),
+        'day': today.date(),
+        'computed_at': now,
+    }
+    for subscription_type, count, new_today, new_week, _ in rows:
+        stats['total_users'] += count
+        stats['new_today'] += new_today
+        stats['new_week'] += new_week
+        if subscription_type is not None:
+            stats['active_subs'] += count
+            stats['plans'][subscription_type] = count
+    return stats
+
+
+def estimate_mrr(stats, prices):
+    """Monthly recurring revenue if every active subscription renews at current prices."""
+    return sum(prices.get(plan, 0) * count for plan, count in stats['plans'].items())
+
+
+class StatsCache:
+    """
+    Cached stats snapshot. Write paths apply their changes to it directly,
+    so the numbers stay current between the periodic full refreshes.
+    """
+
+    def __init__(self, ttl=STATS_CACHE_TTL):
+        self.ttl = ttl
+        self._stats = None
+        self._expires = 0.0
+        # Updated from the DB executor threads and the console admin thread
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Get a copy of the cached stats, or None if they need a refresh."""
+        with self._lock:
+            if self._stats is None or time.monotonic() >= self._expires:
+                return None
+            # New-user counters are per calendar day
+            if self._stats['day'] != datetime.utcnow().date():
+                return None
+            return copy.deepcopy(self._stats)
+
+    def set(self, stats):
+        """Store a freshly computed snapshot."""
+        with self._lock:
+            self._stats = copy.deepcopy(stats)
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        """Force a full refresh on the next read."""
+        with self._lock:
+            self._stats = None
+
+    def add_users(self, count):
+        """Record newly registered users."""
+        if not count:
+            return
+        with self._lock:
+            if self._stats is not None:
+                self._stats['total_users'] += count
+                self._stats['new_today'] += count
+                self._stats['new_week'] += count
+
+    def change_subscription(self, old_type, new_type):
+        """Record a user's subscription changing from old_type to new_type (None = no subscription)."""
+        if old_type == new_type:
+            return
+        with self._lock:
+            if self._stats is None:
+                return
+            plans = self._stats['plans']
+            if old_type is not None:
+                plans[old_type] = plans.get(old_type, 0) - 1
+                self._stats['active_subs'] -= 1
+            if new_type is not None:
+                plans[new_type] = plans.get(new_type, 0) + 1
+                self._stats['active_subs'] += 1
+
+    def add_faq(self, count=1):
+        """Record added FAQ entries."""
+        with self._lock:
+            if self._stats is not None:
+                self._stats['faq_count'] += count
+
+
+admin_stats = StatsCache()
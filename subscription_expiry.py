@@ -0,0 +1,48 @@
+"""
+Subscription expiry for SPEAKYZ bot.
+Periodically clears subscriptions whose subscription_end has passed.
+"""
+
+import logging
+from telegram.ext import ContextTypes
+import repository
+from metrics import registry
+from config import SUBSCRIPTION_EXPIRY_INTERVAL, SUBSCRIPTION_EXPIRY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Counters for monitoring
+expiry_stats = {'runs': 0, 'expired_total': 0, 'last_expired': 0}
+registry.callback('bot_subscriptions_expired_total', 'Subscriptions cleared by the expiry job.',
+                  lambda: expiry_stats['expired_total'], type='counter')
+registry.callback('bot_subscription_expiry_runs_total', 'Completed runs of the subscription expiry job.',
+                  lambda: expiry_stats['runs'], type='counter')
+
+
+async def expire_subscriptions_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback: expire overdue subscriptions."""
+    try:
+        expired = await repository.expire_subscriptions(SUBSCRIPTION_EXPIRY_BATCH_SIZE)
+    except Exception as e:
+        logger.error(f"Error expiring subscriptions: {e}")
+        return
+
+    expiry_stats['runs'] += 1
+    expiry_stats['last_expired'] = expired
+    expiry_stats['expired_total'] += expired
+    if expired:
+        logger.info(f"Expired {expired} subscription(s)")
+
+
+def schedule_expiry_job(job_queue):
+    """Run the expiry job every SUBSCRIPTION_EXPIRY_INTERVAL seconds, starting shortly after startup."""
+    if job_queue is None:
+        logger.warning("JobQueue not available, subscription expiry is disabled")
+        return
+    job_queue.run_repeating(
+        expire_subscriptions_job,
+        interval=SUBSCRIPTION_EXPIRY_INTERVAL,
+        first=10,
+        name="expire_subscriptions"
+    )
+    logger.info(f"Subscription expiry job scheduled every {SUBSCRIPTION_EXPIRY_INTERVAL}s")
@@ -0,0 +1,123 @@
+"""
+Concurrent update processing for SPEAKYZ bot.
+Handles updates of different chats in parallel while keeping the updates
+of each chat strictly in arrival order.
+"""
+
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from metrics import registry
+from config import UPDATE_CONCURRENCY, UPDATE_MAX_PENDING, UPDATE_MAX_PENDING_PER_CHAT, UPDATE_MAX_WAITING
+
+logger = logging.getLogger(__name__)
+
+update_stats = {'processed': 0, 'dropped': 0, 'shed': 0, 'in_flight': 0, 'max_in_flight': 0}
+registry.callback('bot_updates_processed_total', 'Updates handled.',
+                  lambda: update_stats['processed'], type='counter')
+registry.callback('bot_updates_dropped_total', 'Updates dropped because their chat had too many pending.',
+                  lambda: update_stats['dropped'], type='counter')
+registry.callback('bot_updates_shed_total', 'Updates shed because too many were waiting overall.',
+                  lambda: update_stats['shed'], type='counter')
+registry.callback('bot_updates_in_flight', 'Updates being handled right now.',
+                  lambda: update_stats['in_flight'])
+
+
+def serialization_key(update):
+    """Key whose updates must be handled one at a time: the chat, else the user."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Runs up to `concurrency` handlers at once with one FIFO lock per chat.
+    The base class semaphore (max_pending) bounds running plus chat-waiting updates,
+    and at most max_waiting more may wait for it; beyond that new updates are shed.
+    A chat with more than max_pending_per_chat waiting updates has new ones dropped.
+    """
+
+    def __init__(self, concurrency=UPDATE_CONCURRENCY, max_pending=UPDATE_MAX_PENDING,
+                 max_pending_per_chat=UPDATE_MAX_PENDING_PER_CHAT, max_waiting=UPDATE_MAX_WAITING):
+        super().__init__(max(max_pending, concurrency))
+        self.concurrency = concurrency
+        self.max_pending_per_chat = max_pending_per_chat
+        self.max_waiting = max_waiting
+        self._running = None
+        self._queued = 0  # updates inside process_update, including those waiting for the semaphore
+        self._pending = 0  # updates inside do_process_update, running or waiting for their chat
+        self._chats = {}  # key -> [lock, number of updates holding or waiting for it]
+
+    @property
+    def saturated(self):
+        """True when no more updates can be accepted without waiting."""
+        return self._pending >= self.max_concurrent_updates
+
+    async def initialize(self):
+        self._running = asyncio.BoundedSemaphore(self.concurrency)
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    async def process_update(self, update, coroutine):
+        # Polling starts a task per update without waiting for it, so the backlog
+        # has to be bounded here, before the base class semaphore
+        if self._queued >= self.max_concurrent_updates + self.max_waiting:
+            coroutine.close()
+            update_stats['shed'] += 1
+            logger.warning(f"Shedding update: {self._queued} updates already queued")
+            return
+        self._queued += 1
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self._queued -= 1
+
+    async def _run(self, coroutine):
+        async with self._running:
+            update_stats['in_flight'] += 1
+            update_stats['max_in_flight'] = max(update_stats['max_in_flight'], update_stats['in_flight'])
+            try:
+                await coroutine
+            finally:
+                update_stats['in_flight'] -= 1
+                update_stats['processed'] += 1
+
+    async def do_process_update(self, update, coroutine):
+        self._pending += 1
+        try:
+            await self._process(update, coroutine)
+        finally:
+            self._pending -= 1
+
+    async def _process(self, update, coroutine):
+        key = serialization_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        if entry[1] >= self.max_pending_per_chat:
+            # One chat cannot fill the shared pending budget
+            coroutine.close()
+            update_stats['dropped'] += 1
+            logger.warning(f"Dropping update for chat {key}: {entry[1]} updates already pending")
+            return
+
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which preserves per-chat arrival order
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[key]
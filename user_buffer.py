@@ -0,0 +1,134 @@
+"""
+Write-behind buffer for user profile upserts.
+Collects profile changes in memory and flushes them in batches.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+import repository
+from config import USER_FLUSH_INTERVAL, USER_FLUSH_BATCH_SIZE, USER_BUFFER_MAX_PENDING, USER_FLUSH_MAX_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+# How many already-written profiles to remember for no-op detection
+KNOWN_PROFILES_LIMIT = 10000
+
+
+class UserWriteBuffer:
+    """Buffers user profile upserts and writes them as one multi-row upsert."""
+
+    def __init__(self, flush_interval=USER_FLUSH_INTERVAL, batch_size=USER_FLUSH_BATCH_SIZE,
+                 max_pending=USER_BUFFER_MAX_PENDING, max_backoff=USER_FLUSH_MAX_BACKOFF):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max(max_pending, batch_size)
+        self.max_backoff = max_backoff
+        self._pending = {}
+        self._flushing = {}  # batch being written right now
+        self._known = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._flush_task = None  # at most one size-triggered flush at a time
+        self._failures = 0
+        self._retry_at = 0.0  # monotonic time before which background flushes are skipped
+
+    def add(self, telegram_id, username, first_name, last_name):
+        """Queue a profile change. Returns False if nothing changed."""
+        profile = (username, first_name, last_name)
+        if telegram_id not in self._pending and self._known.get(telegram_id) == profile:
+            self._known.move_to_end(telegram_id)
+            return False
+
+        self._pending[telegram_id] = profile
+        self._trim()
+        if len(self._pending) >= self.batch_size and self._flush_task is None and self._flush_due():
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+            self._flush_task.add_done_callback(self._flush_done)
+        return True
+
+    def _flush_done(self, task):
+        self._flush_task = None
+
+    def _flush_due(self):
+        return time.monotonic() >= self._retry_at
+
+    def _trim(self):
+        """Drop the oldest pending changes beyond max_pending, e.g. during a long DB outage."""
+        dropped = 0
+        while len(self._pending) > self.max_pending:
+            del self._pending[next(iter(self._pending))]
+            dropped += 1
+        if dropped:
+            logger.warning(f"User write buffer full, dropped {dropped} oldest profile change(s)")
+
+    def forget(self, telegram_ids):
+        """Drop known profiles, so the next add for these users is written again."""
+        for telegram_id in telegram_ids:
+            self._known.pop(telegram_id, None)
+
+    def is_pending(self, telegram_id):
+        """Check whether a profile change is waiting to be written or still being written."""
+        return telegram_id in self._pending or telegram_id in self._flushing
+
+    async def flush(self):
+        """Write all pending profile changes to the database."""
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            rows = [
+                {'telegram_id': telegram_id, 'username': username,
+                 'first_name': first_name, 'last_name': last_name}
+                for telegram_id, (username, first_name, last_name) in batch.items()
+            ]
+            try:
+                await repository.bulk_upsert_users(rows)
+            except Exception as e:
+                logger.error(f"Error flushing {len(rows)} user profiles: {e}")
+                # Requeue ahead of newer changes, keeping the newer profile of a user in both
+                self._pending = {**batch, **self._pending}
+                self._trim()
+                self._failures += 1
+                delay = min(self.flush_interval * 2 ** (self._failures - 1), self.max_backoff)
+                self._retry_at = time.monotonic() + delay
+                return
+            finally:
+                self._flushing = {}
+
+            self._failures = 0
+            self._retry_at = 0.0
+
+            for telegram_id, profile in batch.items():
+                self._known[telegram_id] = profile
+                self._known.move_to_end(telegram_id)
+            while len(self._known) > KNOWN_PROFILES_LIMIT:
+                self._known.popitem(last=False)
+            logger.debug(f"Flushed {len(rows)} user profiles")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._flush_due():
+                await self.flush()
+
+    def start(self):
+        """Start the periodic flush task on the running loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush task and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+user_writes = UserWriteBuffer()
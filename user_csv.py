@@ -0,0 +1,234 @@
+"""
+Bulk CSV export of users and import of subscriptions for SPEAKYZ bot.
+Uses PostgreSQL COPY when available and batched executemany otherwise.
+"""
+
+import csv
+import io
+import logging
+from datetime import datetime
+from sqlalchemy import select, text
+from models import User, engine, get_db
+from catalog import SUBSCRIPTION_PRICES
+from cache import profile_cache
+from stats import admin_stats
+from repository import SUBSCRIPTION_PERIOD
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ['telegram_id', 'username', 'first_name', 'last_name', 'subscription_type',
+                  'subscription_end', 'speaking_clubs_count', 'is_active', 'created_at']
+
+# Values of subscription_type that clear a subscription
+REMOVE_VALUES = {'', 'none', '-'}
+
+EXECUTEMANY_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+
+
+def _use_copy():
+    return engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2'
+
+
+def export_users(path):
+    """Write all users to a CSV file. Returns the number of rows written."""
+    db = get_db()
+    if not db:
+        raise RuntimeError("Database not available")
+
+    try:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if _use_copy():
+                columns = ", ".join(EXPORT_COLUMNS)
+                cursor = db.connection().connection.cursor()
+                cursor.copy_expert(
+                    f"COPY (SELECT {columns} FROM users ORDER BY id) TO STDOUT WITH CSV HEADER", f
+                )
+                count = cursor.rowcount
+                cursor.close()
+                return count
+
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            rows = db.execute(
+                select(*(getattr(User, column) for column in EXPORT_COLUMNS))
+                .order_by(User.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            count = 0
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+            return count
+    finally:
+        db.close()
+
+
+def _parse_date(value):
+    # Accepts 2025-01-31 as well as exported timestamps
+    return datetime.fromisoformat(value.strip())
+
+
+def read_subscriptions(path):
+    """
+    Read and validate a subscriptions CSV.
+    Needs a telegram_id or username column and a subscription_type column;
+    subscription_end is optional and defaults to 30 days from now.
+    Returns (rows keyed by user, list of error strings).
+    """
+    now = datetime.utcnow()
+    rows = {}
+    errors = []
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        fields = set(reader.fieldnames or [])
+        if 'subscription_type' not in fields or not fields & {'telegram_id', 'username'}:
+            return {}, ["CSV needs a subscription_type column and a telegram_id or username column"]
+
+        for line, record in enumerate(reader, 2):
+            telegram_id = (record.get('telegram_id') or '').strip()
+            username = (record.get('username') or '').strip().lstrip('@').lower()
+            plan = (record.get('subscription_type') or '').strip().lower()
+            end = (record.get('subscription_end') or '').strip()
+
+            if telegram_id and not telegram_id.isdigit():
+                errors.append(f"line {line}: bad telegram_id {telegram_id!r}")
+                continue
+            if not telegram_id and not username:
+                errors.append(f"line {line}: no telegram_id or username")
+                continue
+            if plan in REMOVE_VALUES:
+                plan = None
+            elif plan not in SUBSCRIPTION_PRICES:
+                errors.append(f"line {line}: unknown plan {plan!r}")
+                continue
+
+            if plan is None:
+                end = None
+            elif end:
+                try:
+                    end = _parse_date(end)
+                except ValueError:
+                    errors.append(f"line {line}: bad subscription_end {end!r}")
+                    continue
+            else:
+                end = now + SUBSCRIPTION_PERIOD
+
+            key = ('id', int(telegram_id)) if telegram_id else ('username', username)
+            # The last row for a user wins
+            rows[key] = {
+                'line': line,
+                'telegram_id': int(telegram_id) if telegram_id else None,
+                'username': None if telegram_id else username,
+                'subscription_type': plan,
+                'subscription_end': end,
+            }
+
+    return rows, errors
+
+
+def _load_staging(conn, rows):
+    if _use_copy():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row['line'], row['telegram_id'], row['username'], row['subscription_type'],
+                             row['subscription_end'].isoformat() if row['subscription_end'] else None])
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(
+            "COPY subs_import (line, telegram_id, username, subscription_type, subscription_end) "
+            "FROM STDIN WITH CSV", buffer
+        )
+        cursor.close()
+        return
+
+    insert = text(
+        "INSERT INTO subs_import (line, telegram_id, username, subscription_type, subscription_end) "
+        "VALUES (:line, :telegram_id, :username, :subscription_type, :subscription_end)"
+    )
+    for start in range(0, len(rows), EXECUTEMANY_BATCH_SIZE):
+        conn.execute(insert, rows[start:start + EXECUTEMANY_BATCH_SIZE])
+
+
+# Each returns the key it matched on; SQLite only allows the updated table in RETURNING
+_APPLY_STATEMENTS = [
+    # Rows with a telegram_id
+    """
+    UPDATE users SET subscription_type = s.subscription_type,
+                     subscription_end = s.subscription_end,
+                     speaking_clubs_count = CASE WHEN s.subscription_type IS NULL THEN 0
+                                                 ELSE users.speaking_clubs_count END,
+                     updated_at = :now
+    FROM subs_import s
+    WHERE s.telegram_id IS NOT NULL AND users.telegram_id = s.telegram_id
+    RETURNING users.telegram_id
+    """,
+    # Rows with only a username; matches ix_users_username_lower
+    """
+    UPDATE users SET subscription_type = s.subscription_type,
+                     subscription_end = s.subscription_end,
+                     speaking_clubs_count = CASE WHEN s.subscription_type IS NULL THEN 0
+                                                 ELSE users.speaking_clubs_count END,
+                     updated_at = :now
+    FROM subs_import s
+    WHERE s.telegram_id IS NULL AND lower(users.username) = s.username
+    RETURNING lower(users.username)
+    """,
+]
+
+
+def import_subscriptions(rows, dry_run=False):
+    """
+    Apply validated subscription rows in a single transaction.
+    With dry_run the transaction is rolled back. Returns a summary dict.
+    """
+    if not engine:
+        raise RuntimeError("Database not configured")
+
+    rows = list(rows)
+    summary = {'rows': len(rows), 'updated': 0, 'removed': 0, 'plans': {}, 'unmatched': [], 'dry_run': dry_run}
+
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            conn.execute(text("DROP TABLE IF EXISTS subs_import"))
+            conn.execute(text(
+                "CREATE TEMPORARY TABLE subs_import (line INTEGER, telegram_id BIGINT, username VARCHAR(255), "
+                "subscription_type VARCHAR(50), subscription_end TIMESTAMP)"
+            ))
+            _load_staging(conn, rows)
+
+            matched = set()
+            for key, statement in zip(('telegram_id', 'username'), _APPLY_STATEMENTS):
+                matched.update(
+                    (key, value) for value in conn.execute(text(statement), {'now': datetime.utcnow()}).scalars()
+                )
+            conn.execute(text("DROP TABLE subs_import"))
+
+            if dry_run:
+                transaction.rollback()
+            else:
+                transaction.commit()
+        except Exception:
+            transaction.rollback()
+            raise
+
+    for row in rows:
+        key = ('telegram_id', row['telegram_id']) if row['telegram_id'] else ('username', row['username'])
+        if key not in matched:
+            summary['unmatched'].append(row['line'])
+        elif row['subscription_type'] is None:
+            summary['removed'] += 1
+        else:
+            summary['updated'] += 1
+            summary['plans'][row['subscription_type']] = summary['plans'].get(row['subscription_type'], 0) + 1
+
+    if not dry_run and matched:
+        # Too many users changed to invalidate one by one
+        profile_cache.clear()
+        admin_stats.invalidate()
+        logger.info(f"Imported subscriptions: {summary['updated']} set, {summary['removed']} removed")
+
+    return summary
@@ -0,0 +1,112 @@
+"""
+Webhook server for SPEAKYZ bot.
+Serves Telegram updates and the FAQ site from a single port.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import signal
+from concurrent.futures import ThreadPoolExecutor
+import tornado.web
+from tornado.wsgi import WSGIContainer
+from telegram import Update
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, PORT
+
+logger = logging.getLogger(__name__)
+
+# Threads running the Flask FAQ app, so it never blocks the event loop
+FAQ_WSGI_THREADS = 4
+
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Accepts updates from Telegram and queues them for the bot."""
+
+    SUPPORTED_METHODS = ("POST",)
+
+    def initialize(self, bot_app, secret_token):
+        self.bot_app = bot_app
+        self.secret_token = secret_token
+
+    async def post(self):
+        token = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        # Compared as bytes: compare_digest rejects non-ASCII str with TypeError
+        if not hmac.compare_digest(token.encode('utf-8'), self.secret_token.encode('utf-8')):
+            logger.warning(f"Rejected webhook request with bad secret token from {self.request.remote_ip}")
+            self.send_error(403)
+            return
+
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            self.send_error(400)
+            return
+
+        # Backpressure: Telegram retries rejected deliveries later
+        if getattr(self.bot_app.update_processor, 'saturated', False):
+            self.set_header("Retry-After", "1")
+            self.send_error(429)
+            return
+
+        try:
+            update = Update.de_json(data, self.bot_app.bot)
+        except Exception as e:
+            # Acknowledge it anyway: Telegram would keep redelivering the same bad payload
+            logger.error(f"Ignoring malformed webhook update: {e}")
+            self.set_status(200)
+            return
+        if update:
+            await self.bot_app.update_queue.put(update)
+        self.set_status(200)
+
+
+async def _serve(application, flask_app):
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    webhook_url = WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+
+    await application.bot.set_webhook(
+        url=webhook_url,
+        secret_token=secret_token,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True
+    )
+    await application.start()
+
+    executor = ThreadPoolExecutor(max_workers=FAQ_WSGI_THREADS, thread_name_prefix="faq")
+    web_app = tornado.web.Application([
+        (WEBHOOK_PATH, TelegramWebhookHandler, {"bot_app": application, "secret_token": secret_token}),
+        (r".*", tornado.web.FallbackHandler, {"fallback": WSGIContainer(flask_app, executor=executor)}),
+    ])
+    server = web_app.listen(PORT, address="0.0.0.0", xheaders=True)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    logger.info(f"Webhook server listening on port {PORT}, webhook set to {webhook_url}")
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("Stopping webhook server...")
+        server.stop()
+        await server.close_all_connections()
+        executor.shutdown(wait=False)
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application, flask_app):
+    """Run the bot in webhook mode together with the FAQ site. Blocks until stopped."""
+    asyncio.run(_serve(application, flask_app))